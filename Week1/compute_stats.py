@@ -1,34 +1,53 @@
 #!/usr/bin/env python3
 
 # Reads numbers from standard input and outputs descriptive statistics
-# Meant to be used in conjuction with 'script.sh'
+# Meant to be used in conjuction with 'script.sh', the input does not
+# need to be sorted
 
 import sys
 
-# List comprehension reading from standard input 
+
+def select(values, k):
+    # Return the k-th smallest entry (counting from 0) without sorting
+    # Quickselect: keep only the side of the pivot that holds entry k
+    while True:
+        pivot = values[len(values) // 2]
+        lows = [num for num in values if num < pivot]
+        if k < len(lows):
+            values = lows
+            continue
+        pivot_count = len(values) - len(lows) - len([num for num in values if num > pivot])
+        if k < len(lows) + pivot_count:
+            return pivot
+        k -= len(lows) + pivot_count
+        values = [num for num in values if num > pivot]
+
+
+# List comprehension reading from standard input
 # Ignore entries whose 7 characers are '-9999.0'
 avg_temps = [float(num) for num in sys.stdin if num != "-9999.0\n"]
 
-# Data is sorted, so min and max are the first and last entries
-min_temp = avg_temps[0]
-max_temp = avg_temps[-1]
-
-# Loop over entries to find the average
+# Loop over entries to find min, max and the average
 # I'm avoiding built-ins, so keep a count rather than use len()
+min_temp = avg_temps[0]
+max_temp = avg_temps[0]
 sum_temps = 0
 count = 0
 for num in avg_temps:
+    if num < min_temp:
+        min_temp = num
+    if num > max_temp:
+        max_temp = num
     sum_temps += num
     count += 1
 avg_temp = sum_temps / count
 
-# Calculate median, also relies on sorted data
+# Calculate median by selecting the middle entries, data may be unsorted
 idx = count // 2
 if (count % 2 == 0):
-    median_temp = (avg_temps[idx-1] + avg_temps[idx])/2
+    median_temp = (select(avg_temps, idx-1) + select(avg_temps, idx))/2
 else:
-    median_temp = avg_temps[idx]
+    median_temp = select(avg_temps, idx)
 
 # Print the results as specified
 print("min: ", min_temp, ", max: ", max_temp, ", average: ", avg_temp, ", median: ", median_temp, sep='')
-
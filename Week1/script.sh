@@ -1,4 +1,3 @@
-
 #!/bin/bash
-cut -c63-69 Data.txt | sort -b -n | python3 compute_stats.py
+cut -c63-69 Data.txt | python3 compute_stats.py
 
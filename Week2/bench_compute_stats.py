@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+
+# Times the ways of computing column statistics on synthetic USCRN files of
+# growing size, and saves rows per second and peak memory as JSON so that
+# runs can be compared against an earlier baseline.
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import argparse
+import platform
+import subprocess
+import time
+import logging
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MAKE_USCRN = os.path.join(HERE, 'make_uscrn.py')
+COMPUTE_STATS = os.path.join(HERE, 'compute_stats2.py')
+WEEK1_STATS = os.path.join(HERE, '..', 'Week1', 'compute_stats.py')
+
+# Each engine is a command reading column 9 of the file {fname}. A command
+# given as a string is run by the shell.
+ENGINES = {
+    'week1-stdin': f"cut -c63-69 {{fname}} | {sys.executable} {WEEK1_STATS}",
+    'csv': [sys.executable, COMPUTE_STATS, '9', '{fname}'],
+    'csv-stream': [sys.executable, COMPUTE_STATS, '9', '{fname}', '--stream'],
+    'mmap': [sys.executable, COMPUTE_STATS, '9', '{fname}', '--engine', 'mmap'],
+    'mmap-stream': [sys.executable, COMPUTE_STATS, '9', '{fname}', '--engine', 'mmap', '--stream'],
+    'cache': [sys.executable, COMPUTE_STATS, '9', '{fname}', '--cache'],
+}
+
+
+def run(command, fname):
+    """Run a command on fname, return its wall time and peak RSS in bytes"""
+    if isinstance(command, str):
+        args = command.format(fname=fname)
+    else:
+        args = [arg.format(fname=fname) for arg in command]
+
+    start = time.perf_counter()
+    proc = subprocess.Popen(args, shell=isinstance(command, str),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    # wait4 gives the resource usage of this child and of any it waited for
+    _, status, usage = os.wait4(proc.pid, 0)
+    seconds = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{args} failed: {proc.stderr.read().decode()}")
+    proc.stderr.close()
+    return (seconds, usage.ru_maxrss * 1024)
+
+
+def benchmark(sizes, engines, repeat, data_dir):
+    """Time every engine on a file of every size, return a list of results"""
+    results = []
+    for rows in sizes:
+        fname = os.path.join(data_dir, f"uscrn_{rows}.txt")
+        if not os.path.exists(fname):
+            # Written by another process, as a child's peak RSS can include
+            # the memory this process had when starting it
+            logging.info(f"Writing {fname}")
+            subprocess.run([sys.executable, MAKE_USCRN, str(rows), fname], check=True)
+
+        for engine in engines:
+            # The cache is built by an untimed first run
+            if engine == 'cache':
+                run(ENGINES[engine], fname)
+            runs = [run(ENGINES[engine], fname) for _ in range(repeat)]
+            seconds = min(seconds for seconds, _ in runs)
+            peak_rss = max(rss for _, rss in runs)
+            result = {'engine': engine, 'rows': rows, 'seconds': seconds,
+                      'rows_per_second': rows / seconds, 'peak_rss_bytes': peak_rss}
+            logging.info(result)
+            results.append(result)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Return the results that are slower than the baseline by more than tolerance"""
+    previous = {(r['engine'], r['rows']): r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        before = previous.get((result['engine'], result['rows']))
+        if before and result['rows_per_second'] < before['rows_per_second'] * (1 - tolerance):
+            regressions.append((result, before))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark compute_stats on synthetic USCRN files.')
+
+    parser.add_argument('-n', '--rows', dest='sizes', type=int, nargs='+',
+                        default=[10**3, 10**4, 10**5, 10**6], metavar='<rows>',
+                        help='file sizes to time (default: %(default)s)')
+
+    parser.add_argument('-e', '--engine', dest='engines', action='append',
+                        choices=list(ENGINES),
+                        help='engine to time, repeat for several (default: all)')
+
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='runs per engine and size, the fastest is kept '
+                             '(default: %(default)s)')
+
+    parser.add_argument('-d', '--data-dir', metavar='<dir>',
+                        help='keep the generated files here to reuse them, '
+                             'instead of a temporary directory')
+
+    parser.add_argument('-o', '--output', default='bench_compute_stats.json', metavar='<fname>',
+                        help='JSON file for the results (default: %(default)s)')
+
+    parser.add_argument('-b', '--baseline', metavar='<fname>',
+                        help='earlier results to compare against, exits with 1 '
+                             'if any engine got slower')
+
+    parser.add_argument('-t', '--tolerance', type=float, default=0.2,
+                        help='slowdown relative to the baseline that counts '
+                             'as a regression (default: %(default)s)')
+
+    parser.add_argument('-i', '--info', dest='log_level', action='store_const',
+                        const=logging.INFO, help='print progress')
+
+    args = parser.parse_args()
+    if args.log_level is not None:
+        logging.getLogger().setLevel(args.log_level)
+    if args.repeat < 1 or min(args.sizes) < 1:
+        parser.error("repeat and rows must be at least 1")
+
+    # Read the baseline before the output is written, which may be the same file
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    data_dir = args.data_dir or tempfile.mkdtemp()
+    os.makedirs(data_dir, exist_ok=True)
+    try:
+        results = benchmark(args.sizes, args.engines or list(ENGINES), args.repeat, data_dir)
+    finally:
+        if args.data_dir is None:
+            shutil.rmtree(data_dir)
+
+    report = {'python': platform.python_version(), 'machine': platform.machine(),
+              'cpus': os.cpu_count(), 'results': results}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'engine':>12} {'rows':>10} {'seconds':>10} {'rows/s':>12} {'peak MiB':>10}")
+    for r in results:
+        print(f"{r['engine']:>12} {r['rows']:>10} {r['seconds']:>10.3f} "
+              f"{r['rows_per_second']:>12.0f} {r['peak_rss_bytes'] / 2**20:>10.1f}")
+
+    if baseline:
+        regressions = compare(results, baseline, args.tolerance)
+        for result, before in regressions:
+            print(f"REGRESSION {result['engine']} at {result['rows']} rows: "
+                  f"{result['rows_per_second']:.0f} rows/s, was {before['rows_per_second']:.0f}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+# On-disk cache of the parsed columns of a USCRN file. The first read of a
+# column parses it with uscrn.py and saves it in a directory next to the
+# source; later reads memory map the saved arrays instead of parsing.
+
+import hashlib
+import json
+import os
+from typing import Dict, Sequence
+
+import numpy as np
+
+import uscrn
+
+CACHE_SUFFIX = '.cache'
+META_FILE = 'meta.json'
+
+# Raised when the cached arrays change meaning, e.g. which values are
+# missing, so that caches written by older versions are rebuilt
+CACHE_VERSION = 2
+
+
+def cache_dir(fname: str) -> str:
+    """Return the cache directory of a data file, e.g. Data.txt.cache"""
+    return fname + CACHE_SUFFIX
+
+
+def file_hash(fname: str) -> str:
+    """Return the SHA-256 of the contents of a file"""
+    digest = hashlib.sha256()
+    with open(fname, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _values_path(directory: str, column: int) -> str:
+    return os.path.join(directory, f"field{column:02d}.npy")
+
+
+def _missing_path(directory: str, column: int) -> str:
+    return os.path.join(directory, f"field{column:02d}.missing.npy")
+
+
+def _save(path: str, array: np.ndarray):
+    """Write an array so that a reader never sees a partial file"""
+    tmp = path + '.tmp.npy'
+    np.save(tmp, array)
+    os.replace(tmp, path)
+
+
+def _write_meta(directory: str, meta: Dict):
+    tmp = os.path.join(directory, META_FILE + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(directory, META_FILE))
+
+
+def _read_meta(directory: str) -> Dict:
+    try:
+        with open(os.path.join(directory, META_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _validate(fname: str, directory: str) -> Dict:
+    """Return the metadata of the cache, emptied if it no longer matches fname
+
+    A different size always invalidates the cache. A different mtime alone
+    only means the contents are hashed again, and the cache is kept if the
+    hash still matches.
+    """
+    st = os.stat(fname)
+    meta = _read_meta(directory)
+
+    if meta is not None and meta.get('version') == CACHE_VERSION and meta['size'] == st.st_size:
+        if meta['mtime_ns'] == st.st_mtime_ns:
+            return meta
+        if meta['sha256'] == file_hash(fname):
+            meta['mtime_ns'] = st.st_mtime_ns
+            _write_meta(directory, meta)
+            return meta
+
+    # Start over, removing any columns of the old contents
+    os.makedirs(directory, exist_ok=True)
+    if meta is not None:
+        for column in meta['columns']:
+            for path in (_values_path(directory, column), _missing_path(directory, column)):
+                if os.path.exists(path):
+                    os.remove(path)
+    return {'version': CACHE_VERSION, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns,
+            'sha256': file_hash(fname), 'records': None, 'columns': []}
+
+
+def load_columns(fname: str, columns: Sequence[int]) -> Dict[int, np.ma.MaskedArray]:
+    """Return the given columns (numbered from 1) of a USCRN file, with caching
+
+    Each column is kept as a .npy file of float values plus a .npy bitmap of
+    its missing values. Cached values are memory mapped, not read into memory.
+    """
+    directory = cache_dir(fname)
+    meta = _validate(fname, directory)
+
+    # Parse any columns that are not cached yet, in a single pass
+    missing = [column for column in columns if column not in meta['columns']]
+    if missing:
+        parsed = uscrn.read_columns(fname, missing)
+        for column in missing:
+            _save(_values_path(directory, column), parsed[column].data)
+            _save(_missing_path(directory, column), np.packbits(np.ma.getmaskarray(parsed[column])))
+            meta['records'] = len(parsed[column])
+        meta['columns'] = sorted(set(meta['columns']) | set(missing))
+        _write_meta(directory, meta)
+
+    result = {}
+    for column in columns:
+        values = np.load(_values_path(directory, column), mmap_mode='r')
+        bits = np.load(_missing_path(directory, column))
+        mask = np.unpackbits(bits, count=meta['records']).astype(bool)
+        result[column] = np.ma.MaskedArray(values, mask)
+    return result
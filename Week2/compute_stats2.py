@@ -1,64 +1,796 @@
 #!/usr/bin/env python3
 
 import sys
+import os
 import csv
-from typing import List, Tuple
+import glob
+import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice, repeat
+from operator import itemgetter
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from quantile_sketch import QuantileSketch
+from rolling import RollingStats
+from covariance import PairwiseCovariance
+import uscrn
+import column_cache
+
+# Calendar periods the statistics can be grouped by
+GROUPINGS = ('month', 'season', 'year')
+
+# Records handled at a time when streaming a fixed-width file
+BLOCK_ROWS = 65536
+
+# Meteorological seasons, December counts towards the next year's winter
+SEASONS = ('DJF', 'MAM', 'JJA', 'SON')
+
+# Saved state of --follow, kept next to the data file by default
+STATE_SUFFIX = '.state.json'
+
+# Files kept next to the data that directories and globs pass over: the
+# state of --follow and the temporary file it is saved through
+SIDECAR_SUFFIXES = (STATE_SUFFIX, STATE_SUFFIX + '.tmp')
+STATE_VERSION = 1
+
+# Bytes at the start of a file and before the saved offset that must be
+# unchanged for the saved state to still apply
+CHECK_BYTES = 4096
+
 
 def main():
+    parser = argparse.ArgumentParser(
+        description='Compute min, max, average and median of columns of '
+                    'space delimited data.',
+        usage='%(prog)s [options] <column> [<column> ...] [<fname>]')
 
-    if (len(sys.argv) < 2):
-        print("Not enough arguments provided")
-        sys.exit(1)
+    parser.add_argument('items', nargs='+', metavar='<column>',
+                        help='numbers of the columns to analyze, starting at 1 '
+                             '(may be left out with --cov), '
+                             'optionally followed by the file to read '
+                             '(standard input if omitted), or by a directory '
+                             'or quoted glob of station files')
+
+    parser.add_argument('--stream', action='store_true',
+                        help='compute the statistics in a single pass without '
+                             'storing the values; the median is estimated '
+                             'to within 0.5%% of its value')
+
+    parser.add_argument('--engine', choices=['csv', 'mmap'], default='csv',
+                        help='how to read the data: csv splits every line, '
+                             'mmap memory maps a fixed-width USCRN file and '
+                             'slices the columns out of every record at once '
+                             '(default: %(default)s)')
+
+    parser.add_argument('--cache', action='store_true',
+                        help='keep the parsed columns in <fname>.cache and '
+                             'load them from there while the file is unchanged; '
+                             'uses the mmap engine')
+
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(),
+                        metavar='<n>',
+                        help='processes used to read a directory or glob of '
+                             'files (default: %(default)s)')
+
+    parser.add_argument('-r', '--rolling', dest='windows', metavar='<days>',
+                        type=int, action='append',
+                        help='instead print min, max, average and median over '
+                             'this number of most recent days, one csv row per '
+                             'day; repeat for several windows, e.g. -r 7 -r 30')
+
+    parser.add_argument('-g', '--group-by', dest='group_by', choices=GROUPINGS,
+                        help='report the statistics of every calendar month, '
+                             'season or year of the date in the second column')
+
+    parser.add_argument('-c', '--cov', action='store_true',
+                        help='instead print the covariance and correlation '
+                             'matrices of the columns, by default every '
+                             'measurement column of a USCRN file, each pair '
+                             'using the rows where both have a value')
+
+    parser.add_argument('-f', '--follow', action='store_true',
+                        help='keep the running statistics and how far the file '
+                             'has been read in a state file, and on later runs '
+                             'only read the lines appended since; the median is '
+                             'estimated as with --stream')
 
+    parser.add_argument('--state', metavar='<state-file>',
+                        help='state file used by --follow '
+                             '(default: <fname>%s)' % STATE_SUFFIX.replace('%', '%%'))
+
+    parser.add_argument('-p', '--percentile', dest='percentiles', metavar='<pct>',
+                        action='append', type=float, default=[],
+                        help='also report this percentile, e.g. -p 5 -p 95')
+
+    args = parser.parse_intermixed_args()
+    for pct in args.percentiles:
+        if not 0 <= pct <= 100:
+            parser.error("percentiles must be between 0 and 100")
     try:
-        # First argument what numbered column will be analyzed
-        col = int(sys.argv[1]) - 1
-    except ValueError:
-        print("First argument must be an INT of desired column")
+        columns, fname = parse_columns(args.items, require_columns=not args.cov)
+    except ValueError as e:
+        parser.error(str(e))
+    if not columns:
+        columns = list(uscrn.MEASUREMENT_FIELDS)
+    if args.windows is not None:
+        if fname is not None and (os.path.isdir(fname) or glob.has_magic(fname)):
+            parser.error("--rolling reads a single file")
+        if args.engine != 'csv' or args.cache or args.stream or args.follow or args.percentiles:
+            parser.error("--rolling cannot be combined with --engine mmap, --cache, --stream, --follow or -p")
+    if args.follow and (args.engine != 'csv' or args.cache or args.stream):
+        parser.error("--follow cannot be combined with --engine mmap, --cache or --stream")
+    if args.cache:
+        args.engine = 'mmap'
+    if args.engine == 'mmap' and fname is None:
+        parser.error("the mmap engine needs a file name, it cannot read stdin")
+    if args.workers < 1:
+        parser.error("workers must be at least 1")
+    if args.windows is not None and min(args.windows) < 1:
+        parser.error("rolling windows must be at least 1 day")
+    if args.group_by and (args.follow or args.windows is not None):
+        parser.error("--group-by cannot be combined with --follow or --rolling")
+    if args.cov and (args.group_by or args.follow or args.windows is not None):
+        parser.error("--cov cannot be combined with --group-by, --follow or --rolling")
+    if args.follow and (fname is None or os.path.isdir(fname) or glob.has_magic(fname)):
+        parser.error("--follow needs the name of a single file")
+
+    # Column numbers alone read data from stdin, a trailing
+    # name reads the csv file of that name (space delimited)
+    qs = [pct / 100 for pct in args.percentiles]
+    if args.windows is not None:
+        writer = csv.writer(sys.stdout)
+        writer.writerow(['date'] + [f"{column}_{window}d_{stat}" for column in columns
+                                    for window in args.windows for stat in ('min', 'max', 'average', 'median')])
+        with open(fname, "r") if fname is not None else sys.stdin as csv_file:
+            for date, results in analyze_rolling(csv_file, columns, args.windows):
+                writer.writerow([date] + ["" if value is None else f"{value:.3f}"
+                                          for stats in results for value in stats])
+        return
+
+    if args.cov:
+        try:
+            if fname is not None and (os.path.isdir(fname) or glob.has_magic(fname)):
+                cov = analyze_covariance_files(expand_files(fname), columns, args.engine, args.cache, args.workers)
+            elif args.engine == 'mmap':
+                cov = covariance_fixed_width(fname, columns, args.cache)
+            elif fname is None:
+                cov = covariance(sys.stdin, columns)
+            else:
+                with open(fname, "r") as csv_file:
+                    cov = covariance(csv_file, columns)
+        except ValueError as e:
+            print(e)
+            sys.exit(1)
+        print_matrix('covariance', columns, cov.covariance())
+        print()
+        print_matrix('correlation', columns, cov.correlation())
+        return
+
+    if args.group_by is not None and not (fname is not None and (os.path.isdir(fname) or glob.has_magic(fname))):
+        try:
+            if args.engine == 'mmap':
+                groups = analyze_groups_fixed_width(fname, columns, args.group_by, args.cache)
+            elif fname is None:
+                groups = analyze_groups(sys.stdin, columns, args.group_by)
+            else:
+                with open(fname, "r") as csv_file:
+                    groups = analyze_groups(csv_file, columns, args.group_by)
+        except ValueError as e:
+            print(e)
+            sys.exit(1)
+        print_group_table(args.group_by, columns, sorted_groups(groups, args.group_by), qs)
+        return
+
+    if fname is not None and (os.path.isdir(fname) or glob.has_magic(fname)):
+        if args.group_by is not None:
+            parser.error("--group-by reads a single file")
+        fnames = expand_files(fname)
+        if not fnames:
+            print(f"No files found in {fname}")
+            sys.exit(1)
+        try:
+            stations, overall = analyze_files(fnames, columns, args.engine, args.cache, args.workers)
+        except ValueError as e:
+            print(e)
+            sys.exit(1)
+        print_station_table(columns, stations, overall, qs)
+        return
+
+    try:
+        if args.follow:
+            results = analyze_incremental(fname, columns, qs, args.state)
+        elif args.engine == 'mmap':
+            results = analyze_fixed_width(fname, columns, args.stream, qs, args.cache)
+        elif fname is None:
+            results = analyze(sys.stdin, columns, args.stream, qs)
+        else:
+            with open(fname, "r") as csv_file:
+                results = analyze(csv_file, columns, args.stream, qs)
+    except ValueError as e:
+        print(e)
         sys.exit(1)
 
-    # Single argument is a column number, data read from stdin
-    # Two arguments is a column followed by name of a csv file (space delimited)
-    if (len(sys.argv) == 2):
-        reader = csv.reader(sys.stdin, delimiter=' ', skipinitialspace=True)
-        data = [float(row[col]) for row in reader if row[col] != '-9999.0' and row[col] != '-99.000']
+    if len(columns) == 1:
+        (stats, quantiles), = results
+        (min_temp, max_temp, avg_temp, median_temp) = stats
+        print("min: ", min_temp, ", max: ", max_temp, ", average: ", avg_temp, ", median: ", median_temp, sep='')
+        if quantiles:
+            print(", ".join(f"p{pct:g}: {value}" for pct, value in zip(args.percentiles, quantiles)))
     else:
-        with open("Data.txt","r") as csv_file:
-            reader = csv.reader(csv_file, delimiter=' ', skipinitialspace=True)
-            data = [float(row[col]) for row in reader if row[col] != '-9999.0' and row[col] != '-99.000']
+        print_table(columns, results, args.percentiles)
+
+
+def parse_columns(items: List[str], require_columns: bool = True) -> Tuple:
+    """Split command line items into column numbers and an optional file name"""
+    columns = []
+    for i, item in enumerate(items):
+        try:
+            column = int(item)
+        except ValueError:
+            # Only the last item may be a file name
+            if i != len(items) - 1 or (i == 0 and require_columns):
+                raise ValueError(f"Column must be an INT, got '{item}'")
+            return (columns, item)
+        if column < 1:
+            raise ValueError("Columns are numbered starting at 1")
+        columns.append(column)
+    return (columns, None)
+
+
+def print_table(columns: List[int], results: List, percentiles: List[float]):
+    """Print one row of statistics per column"""
+    header = ['column', 'min', 'max', 'average', 'median'] + [f"p{pct:g}" for pct in percentiles]
+    print(" ".join(f"{name:>10}" for name in header))
+    for column, (stats, quantiles) in zip(columns, results):
+        values = ["" if value is None else f"{value:.3f}" for value in list(stats) + quantiles]
+        print(" ".join(f"{value:>10}" for value in [str(column)] + values))
+
+
+def print_station_table(columns: List[int], stations: Dict, overall: List, qs: Sequence):
+    """Print one row of statistics per station and column, then the totals"""
+    print_group_table('station', columns, sorted(stations.items()) + [('ALL', overall)], qs)
+
+
+def print_group_table(label: str, columns: List[int], groups: List, qs: Sequence):
+    """Print one row of statistics per group and column
+
+    groups is a list of (name, [RunningStats per column]) pairs.
+    """
+    header = [label, 'column', 'count', 'min', 'max', 'average', 'median'] + [f"p{q * 100:g}" for q in qs]
+    print(" ".join(f"{name:>10}" for name in header))
+    for name, stats in groups:
+        for column, col_stats in zip(columns, stats):
+            values = ["" if value is None else f"{value:.3f}"
+                      for value in list(col_stats.result()) + [col_stats.quantile(q) for q in qs]]
+            print(" ".join(f"{value:>10}" for value in [name, str(column), str(col_stats.count)] + values))
+
+
+def print_matrix(title: str, columns: List[int], matrix: np.ndarray):
+    """Print a square matrix with the column numbers along both edges"""
+    print(" ".join(f"{name:>10}" for name in [title] + [str(column) for column in columns]))
+    for column, row in zip(columns, matrix):
+        print(" ".join(f"{value:>10}" for value in [str(column)] + ["" if np.isnan(v) else f"{v:.4f}" for v in row]))
+
+
+def expand_files(name: str) -> List[str]:
+    """Return the data files in a directory, or matching a glob, in order
+
+    Hidden files, --follow state files and --cache directories are not data.
+    """
+    if os.path.isdir(name):
+        fnames = [os.path.join(name, entry) for entry in os.listdir(name) if not entry.startswith('.')]
+    else:
+        fnames = glob.glob(name)
+    return sorted(fname for fname in fnames
+                  if os.path.isfile(fname) and not fname.endswith(SIDECAR_SUFFIXES))
+
+
+def file_partials(fname: str, columns: Sequence[int], engine: str = 'csv', cache: bool = False) -> Dict:
+    """Return a RunningStats for each column (numbered from 1) of each station in a file
+
+    The result maps the station number, the first field of every record, to
+    a list of partial aggregates that can be merged with those of other files.
+    """
+    partials = {}
+    if engine == 'mmap':
+        for block in fixed_width_blocks(fname, [1] + list(columns), cache):
+            station_ids = block[1].data.astype(np.int64)
+            for station_id in np.unique(station_ids):
+                in_station = station_ids == station_id
+                # Keep the zero padding of the five digit WBANNO, like the csv engine
+                stats = partials.setdefault(f"{station_id:05d}", [RunningStats() for column in columns])
+                for col_stats, column in zip(stats, columns):
+                    col_stats.add_array(block[column][in_station].compressed())
+        return partials
+
+    missing = [uscrn.missing_values(column) for column in columns]
+    with open(fname, "r") as csv_file:
+        for row in csv.reader(csv_file, delimiter=' ', skipinitialspace=True):
+            stats = partials.get(row[0])
+            if stats is None:
+                stats = partials[row[0]] = [RunningStats() for column in columns]
+            for col_stats, column, sentinels in zip(stats, columns, missing):
+                if row[column - 1] not in sentinels:
+                    col_stats.add(float(row[column - 1]))
+    return partials
+
+
+def analyze_files(fnames: Sequence[str], columns: Sequence[int], engine: str = 'csv',
+                  cache: bool = False, workers: int = 1) -> Tuple:
+    """Return the merged statistics of many files, per station and overall
+
+    Each file is reduced to partial aggregates in a pool of worker
+    processes, and the partials are merged as they come back. Medians and
+    percentiles are estimated from the merged quantile sketches.
+    """
+    if workers == 1:
+        partials = map(file_partials, fnames, repeat(columns), repeat(engine), repeat(cache))
+        return merge_partials(partials, len(columns))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        partials = executor.map(file_partials, fnames, repeat(columns), repeat(engine), repeat(cache))
+        return merge_partials(partials, len(columns))
+
+
+def merge_partials(partials, num_columns: int) -> Tuple:
+    """Merge the results of file_partials() into per station and overall stats"""
+    stations = {}
+    overall = [RunningStats() for _ in range(num_columns)]
+    for partial in partials:
+        for station, stats in partial.items():
+            merged = stations.setdefault(station, [RunningStats() for _ in range(num_columns)])
+            for total, station_total, col_stats in zip(overall, merged, stats):
+                station_total.merge(col_stats)
+                total.merge(col_stats)
+    return (stations, overall)
+
+
+def group_key(date: int, group_by: str) -> int:
+    """Return the key of the month, season or year of a YYYYMMDD date
+
+    Keys are YYYY00 for a year, YYYYMM for a month and YYYY0S for season S,
+    numbered from 1 for winter, so that they sort in calendar order.
+    """
+    year, month = date // 10000, date // 100 % 100
+    if group_by == 'year':
+        return year * 100
+    if group_by == 'month':
+        return year * 100 + month
+    # December is the first month of next year's winter
+    year = year + (month == 12)
+    return year * 100 + month % 12 // 3 + 1
+
+
+def group_name(key: int, group_by: str) -> str:
+    """Return the label of a key made by group_key(), e.g. 2018-03 or 2019-DJF"""
+    year, part = divmod(key, 100)
+    if group_by == 'year':
+        return str(year)
+    if group_by == 'month':
+        return f"{year}-{part:02d}"
+    return f"{year}-{SEASONS[part - 1]}"
+
+
+def sorted_groups(groups: Dict, group_by: str) -> List:
+    """Return (label, stats) pairs of the groups in calendar order"""
+    return [(group_name(key, group_by), stats) for key, stats in sorted(groups.items())]
+
+
+def analyze_groups(lines, columns: Sequence[int], group_by: str) -> Dict:
+    """Return a RunningStats per column (numbered from 1) for each calendar group
+
+    Lines are read in one pass, keeping only the running statistics of each
+    group, keyed by group_key() of the date in the second column.
+    """
+    groups = {}
+    missing = [uscrn.missing_values(column) for column in columns]
+    for row in csv.reader(lines, delimiter=' ', skipinitialspace=True):
+        key = group_key(int(row[1]), group_by)
+        stats = groups.get(key)
+        if stats is None:
+            stats = groups[key] = [RunningStats() for column in columns]
+        for col_stats, column, sentinels in zip(stats, columns, missing):
+            if row[column - 1] not in sentinels:
+                col_stats.add(float(row[column - 1]))
+    return groups
+
+
+def analyze_groups_fixed_width(fname: str, columns: Sequence[int], group_by: str, cache: bool = False) -> Dict:
+    """Like analyze_groups(), reading a fixed-width USCRN file a block at a time"""
+    groups = {}
+    for block in fixed_width_blocks(fname, [2] + list(columns), cache):
+        keys = group_key(block[2].data.astype(np.int64), group_by)
+        for key in np.unique(keys):
+            in_group = keys == key
+            stats = groups.setdefault(int(key), [RunningStats() for column in columns])
+            for col_stats, column in zip(stats, columns):
+                col_stats.add_array(block[column][in_group].compressed())
+    return groups
+
+
+def covariance(lines, columns: Sequence[int]) -> PairwiseCovariance:
+    """Return the pairwise covariance of the columns (numbered from 1) of the lines
+
+    Lines are split and converted BLOCK_ROWS at a time.
+    """
+    cov = PairwiseCovariance(len(columns))
+    reader = csv.reader(lines, delimiter=' ', skipinitialspace=True)
+    while True:
+        block = np.array([[row[column - 1] for column in columns] for row in islice(reader, BLOCK_ROWS)],
+                         dtype=str).reshape(-1, len(columns))
+        if len(block) == 0:
+            return cov
+        missing = np.column_stack([np.isin(block[:, i], uscrn.missing_values(column))
+                                   for i, column in enumerate(columns)])
+        cov.add_block(np.where(missing, '0', block).astype(float), missing)
+
+
+def covariance_fixed_width(fname: str, columns: Sequence[int], cache: bool = False) -> PairwiseCovariance:
+    """Like covariance(), reading a fixed-width USCRN file a block at a time"""
+    cov = PairwiseCovariance(len(columns))
+    for block in fixed_width_blocks(fname, columns, cache):
+        values = np.column_stack([block[column].data for column in columns])
+        missing = np.column_stack([np.ma.getmaskarray(block[column]) for column in columns])
+        cov.add_block(values, missing)
+    return cov
+
 
-    # compute_stats() only accepts sorted data 
-    data.sort()
-    (min_temp, max_temp, avg_temp, median_temp) = compute_stats(data)
-    print("min: ", min_temp, ", max: ", max_temp, ", average: ", avg_temp, ", median: ", median_temp, sep='')
+def file_covariance(fname: str, columns: Sequence[int], engine: str = 'csv', cache: bool = False) -> PairwiseCovariance:
+    """Return the pairwise covariance of the columns of one file"""
+    if engine == 'mmap':
+        return covariance_fixed_width(fname, columns, cache)
+    with open(fname, "r") as csv_file:
+        return covariance(csv_file, columns)
+
+
+def analyze_covariance_files(fnames: Sequence[str], columns: Sequence[int], engine: str = 'csv',
+                             cache: bool = False, workers: int = 1) -> PairwiseCovariance:
+    """Return the covariance of the columns over many files, merged from one per file"""
+    total = PairwiseCovariance(len(columns))
+    if workers == 1:
+        for cov in map(file_covariance, fnames, repeat(columns), repeat(engine), repeat(cache)):
+            total.merge(cov)
+        return total
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for cov in executor.map(file_covariance, fnames, repeat(columns), repeat(engine), repeat(cache)):
+            total.merge(cov)
+    return total
+
+
+def analyze_incremental(fname: str, columns: Sequence[int], qs: Sequence = (), state_fname: str = None) -> List:
+    """Like analyze(), but only read the part of a file not seen on earlier runs
+
+    The running statistics of the columns (numbered from 1) are saved with
+    the offset of the last complete line read. If the saved state does not
+    match the file or the columns any more, the file is read from the start.
+    """
+    if state_fname is None:
+        state_fname = fname + STATE_SUFFIX
+
+    state = load_state(fname, columns, state_fname)
+    if state is None:
+        offset, stats = 0, [RunningStats() for column in columns]
+    else:
+        offset, stats = state
+
+    with open(fname, "rb") as f:
+        f.seek(offset)
+        read_to = offset
+
+        # A line still being written is left for the next run
+        def complete_lines():
+            nonlocal read_to
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                read_to += len(line)
+                yield line.decode()
+
+        add_rows(stats, csv.reader(complete_lines(), delimiter=' ', skipinitialspace=True), columns)
+
+    save_state(fname, columns, state_fname, read_to, stats)
+    return [(s.result(), [s.quantile(q) for q in qs]) for s in stats]
+
+
+def file_check(fname: str, offset: int) -> str:
+    """Return a hash of the start of a file and of the bytes before offset"""
+    digest = hashlib.sha256()
+    with open(fname, "rb") as f:
+        digest.update(f.read(min(offset, CHECK_BYTES)))
+        f.seek(max(offset - CHECK_BYTES, 0))
+        digest.update(f.read(offset - f.tell()))
+    return digest.hexdigest()
+
+
+def load_state(fname: str, columns: Sequence[int], state_fname: str):
+    """Return the saved offset and RunningStats, or None if they are out of date"""
+    try:
+        with open(state_fname) as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        print(f"Cannot read {state_fname}, reading all of {fname}", file=sys.stderr)
+        return None
+
+    if (state.get('version') != STATE_VERSION or state.get('columns') != list(columns)
+            or os.path.getsize(fname) < state['offset']
+            or file_check(fname, state['offset']) != state['check']):
+        print(f"{state_fname} does not match {fname}, reading all of it", file=sys.stderr)
+        return None
+
+    return (state['offset'], [RunningStats.from_dict(d) for d in state['stats']])
+
+
+def save_state(fname: str, columns: Sequence[int], state_fname: str, offset: int, stats: List):
+    """Save how far fname has been read and the statistics so far"""
+    state = {'version': STATE_VERSION,
+             'columns': list(columns),
+             'offset': offset,
+             'check': file_check(fname, offset),
+             'stats': [s.to_dict() for s in stats]}
+    tmp = state_fname + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, state_fname)
+
+
+def analyze_rolling(lines, columns: Sequence[int], windows: Sequence[int]):
+    """Yield the date and rolling stats of the columns (numbered from 1) for each line
+
+    Each line is taken to be one day, the date being the second column.
+    For every column and then every window the stats are min, max,
+    average, and median, all None until the window has filled up.
+    """
+    reader = csv.reader(lines, delimiter=' ', skipinitialspace=True)
+    rolling = [[RollingStats(window) for window in windows] for column in columns]
+    missing = [uscrn.missing_values(column) for column in columns]
+
+    for row in reader:
+        results = []
+        for col_windows, column, sentinels in zip(rolling, columns, missing):
+            value = None if row[column - 1] in sentinels else float(row[column - 1])
+            for stats in col_windows:
+                stats.push(value)
+                results.append(stats.result() if stats.is_full() else (None, None, None, None))
+        yield (row[1], results)
+
+
+def analyze(lines, columns: Sequence[int], stream: bool = False, qs: Sequence = ()) -> List:
+    """Return the stats and the quantiles qs of each of the columns (numbered from 1)
+
+    Every line is split once and each column skips its own missing values,
+    so a gap in one column does not drop the row from the others.
+    """
+    reader = csv.reader(lines, delimiter=' ', skipinitialspace=True)
+
+    if stream:
+        stats = [RunningStats() for column in columns]
+        add_rows(stats, reader, columns)
+        return [(s.result(), [s.quantile(q) for q in qs]) for s in stats]
+
+    missing = [uscrn.missing_values(column) for column in columns]
+
+    # Data can be in any order, compute_stats() does not need it sorted
+    data = [[] for column in columns]
+    for row in reader:
+        for values, column, sentinels in zip(data, columns, missing):
+            if row[column - 1] not in sentinels:
+                values.append(float(row[column - 1]))
+    return [(compute_stats(values), compute_quantiles(values, qs)) for values in data]
+
+
+def add_rows(stats: Sequence, reader, columns: Sequence[int]):
+    """Add the values of the columns (numbered from 1) of the rows of a csv reader to stats
+
+    Only the fields of the columns are kept from each row, BLOCK_ROWS rows
+    at a time, and each column of a block is converted to a NumPy array at
+    once. Each column skips its own missing values, compared as numbers.
+    """
+    pick = itemgetter(*[column - 1 for column in columns])
+    missing = [[float(value) for value in uscrn.missing_values(column)] for column in columns]
+    while True:
+        rows = list(map(pick, islice(reader, BLOCK_ROWS)))
+        if not rows:
+            return
+        fields = zip(*rows) if len(columns) > 1 else [rows]
+        for col_stats, field, sentinels in zip(stats, fields, missing):
+            values = np.array(field, dtype=float)
+            col_stats.add_array(values[~np.isin(values, sentinels)])
+
+
+def analyze_fixed_width(fname: str, columns: Sequence[int], stream: bool = False, qs: Sequence = (),
+                        cache: bool = False) -> List:
+    """Like analyze(), reading the columns (numbered from 1) of a USCRN file
+
+    The file is memory mapped and parsed with NumPy, see uscrn.py, or loaded
+    from its column cache, see column_cache.py. When streaming, the records
+    are read a block at a time.
+    """
+    if stream:
+        stats = [RunningStats() for column in columns]
+        for block in fixed_width_blocks(fname, columns, cache):
+            for col_stats, column in zip(stats, columns):
+                col_stats.add_array(block[column].compressed())
+        return [(s.result(), [s.quantile(q) for q in qs]) for s in stats]
+
+    data = next(fixed_width_blocks(fname, columns, cache, block_rows=None))
+    return [(array_stats(data[column].compressed()), compute_quantiles(data[column].compressed(), qs))
+            for column in columns]
+
+
+def fixed_width_blocks(fname: str, columns: Sequence[int], cache: bool = False, block_rows: int = BLOCK_ROWS):
+    """Yield the given columns of a fixed-width file block_rows records at a time
+
+    With cache the columns come from column_cache.py, otherwise they are
+    parsed from the file. A block_rows of None yields everything at once.
+    """
+    if not cache:
+        if block_rows is None:
+            yield uscrn.read_columns(fname, columns)
+        else:
+            yield from uscrn.iter_blocks(fname, columns, block_rows)
+        return
+
+    data = column_cache.load_columns(fname, columns)
+    if block_rows is None:
+        yield data
+        return
+    for start in range(0, len(data[columns[0]]), block_rows):
+        yield dict((column, data[column][start:start + block_rows]) for column in columns)
+
+
+def array_stats(values: np.ndarray) -> Tuple:
+    """Return min, max, average, and median of a NumPy array, like compute_stats"""
+    if len(values) == 0:
+        return (None, None, None, None)
+    (o_median,) = compute_quantiles(values, [0.5])
+    return (values.min().item(), values.max().item(), values.mean().item(), o_median)
 
 
 def compute_stats(values: List) -> Tuple:
-    """Return min, max, average, and median values of sorted list"""
+    """Return min, max, average, and median values of an unsorted list"""
 
     if (values is None or len(values) == 0):
         return (None, None, None, None)
 
     values_len = len(values)
 
-    # Data is sorted, min and max are first and last values
-    o_min = values[0]
-    o_max = values[-1]
-
-    # Calculate average
+    # Find min, max and the sum in one pass over the values
+    o_min = o_max = values[0]
     o_sum = 0
     for num in values:
+        if num < o_min:
+            o_min = num
+        elif num > o_max:
+            o_max = num
         o_sum += num
     o_avg = o_sum / values_len
 
-    # Calculate median
-    idx = values_len // 2
-    if (values_len % 2 == 0):
-        o_median = (values[idx-1] + values[idx])/2
-    else:
-        o_median = values[idx]
+    # Median is found by selection rather than by sorting
+    (o_median,) = compute_quantiles(values, [0.5])
 
     return (o_min, o_max, o_avg, o_median)
 
+
+def compute_quantiles(values: Sequence, qs: Sequence) -> List:
+    """Return the exact quantiles qs (each between 0 and 1) of unsorted values
+
+    Quantiles between two values are interpolated linearly, so the 0.5
+    quantile of an even number of values is the mean of the middle two. The
+    ranks needed are found with numpy's introselect partition, which runs in
+    linear time instead of the n log n of a full sort."""
+
+    for q in qs:
+        if not 0 <= q <= 1:
+            raise ValueError("Quantiles must be between 0 and 1")
+
+    if (values is None or len(values) == 0):
+        return [None for q in qs]
+    if len(qs) == 0:
+        return []
+
+    data = np.asarray(values, dtype=float)
+    ranks = [q * (len(data) - 1) for q in qs]
+
+    # Partition once around every rank that is needed
+    kth = sorted({int(rank) for rank in ranks} | {min(int(rank) + 1, len(data) - 1) for rank in ranks})
+    data = np.partition(data, kth)
+
+    quantiles = []
+    for rank in ranks:
+        lower = data[int(rank)]
+        if rank == int(rank):
+            quantiles.append(lower.item())
+        else:
+            upper = data[int(rank) + 1]
+            quantiles.append((lower + (upper - lower) * (rank - int(rank))).item())
+    return quantiles
+
+
+class RunningStats:
+    """Single pass min, max, average and median of a stream of values.
+
+    Only a count, a sum and a QuantileSketch are kept, so memory does not grow
+    with the length of the stream. Min, max and average are exact; the median
+    is within the sketch's relative accuracy of the true median.
+    """
+
+    def __init__(self, relative_accuracy=0.005):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.sketch = QuantileSketch(relative_accuracy)
+
+    def add(self, value):
+        """Include a single value in the statistics."""
+        if self.count == 0:
+            self.min = self.max = value
+        elif value < self.min:
+            self.min = value
+        elif value > self.max:
+            self.max = value
+        self.count += 1
+        self.total += value
+        self.sketch.add(value)
+
+    def add_array(self, values):
+        """Include every value of a NumPy array in the statistics."""
+        if len(values) == 0:
+            return
+        low, high = values.min().item(), values.max().item()
+        if self.count == 0 or low < self.min:
+            self.min = low
+        if self.count == 0 or high > self.max:
+            self.max = high
+        self.count += len(values)
+        self.total += values.sum().item()
+        self.sketch.add_array(values)
+
+    def merge(self, other):
+        """Combine the statistics of another RunningStats into this one."""
+        if other.count == 0:
+            return
+        if self.count == 0 or other.min < self.min:
+            self.min = other.min
+        if self.count == 0 or other.max > self.max:
+            self.max = other.max
+        self.count += other.count
+        self.total += other.total
+        self.sketch.merge(other.sketch)
+
+    def to_dict(self):
+        """Return the statistics as a dict that can be saved as JSON."""
+        return {'count': self.count, 'total': self.total, 'min': self.min,
+                'max': self.max, 'sketch': self.sketch.to_dict()}
+
+    @classmethod
+    def from_dict(cls, d):
+        """Return the statistics saved by to_dict()."""
+        stats = cls()
+        stats.count, stats.total = d['count'], d['total']
+        stats.min, stats.max = d['min'], d['max']
+        stats.sketch = QuantileSketch.from_dict(d['sketch'])
+        return stats
+
+    def quantile(self, q):
+        """Return the estimated value at quantile q, clamped to min and max."""
+        if self.count == 0:
+            return None
+        return min(max(self.sketch.quantile(q), self.min), self.max)
+
+    def result(self) -> Tuple:
+        """Return min, max, average, and estimated median, like compute_stats"""
+        if self.count == 0:
+            return (None, None, None, None)
+        return (self.min, self.max, self.total / self.count, self.quantile(0.5))
+
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+# Streaming pairwise-complete covariance and correlation of many columns,
+# built up from blocks of rows that may have missing values.
+
+import numpy as np
+
+
+class PairwiseCovariance:
+    """Covariance and correlation of p columns, updated a block at a time.
+
+    Every pair of columns only uses the rows where both have a value. For each
+    pair (i, j) the count, the mean and sum of squared deviations of column i
+    over those rows, and the co-moment of i and j are kept, so the matrices
+    are (p, p) and the mean of column j for the pair is means[j, i].
+
+    A block is summarised around its own column means and then combined with
+    the running totals by the pairwise update of Chan et al., which avoids
+    the cancellation of summing raw squares. Two instances can be merged the
+    same way, so files can be processed separately and combined.
+    """
+
+    def __init__(self, num_columns: int):
+        shape = (num_columns, num_columns)
+        self.num_columns = num_columns
+        self.counts = np.zeros(shape)
+        self.means = np.zeros(shape)
+        self.sq_devs = np.zeros(shape)
+        self.comoments = np.zeros(shape)
+
+    def add_block(self, values: np.ndarray, missing: np.ndarray = None):
+        """Include an (n, p) block of rows, missing marking values to leave out"""
+        values = np.asarray(values, dtype=float)
+        if missing is None:
+            missing = np.zeros(values.shape, dtype=bool)
+        if values.shape[0] == 0:
+            return
+        valid = (~missing).astype(float)
+
+        # Centre each column on its block mean before summing products
+        counts = valid.T @ valid
+        col_counts = np.diag(counts)
+        shift = np.divide((np.where(missing, 0, values)).sum(axis=0), col_counts,
+                          out=np.zeros(self.num_columns), where=col_counts > 0)
+        centred = np.where(missing, 0, values - shift)
+
+        sums = centred.T @ valid
+        products = centred.T @ centred
+        squares = (centred ** 2).T @ valid
+
+        block = PairwiseCovariance(self.num_columns)
+        has_rows = counts > 0
+        block.counts = counts
+        mean_offsets = np.divide(sums, counts, out=np.zeros_like(sums), where=has_rows)
+        block.means = np.where(has_rows, mean_offsets + shift[:, None], 0)
+        block.sq_devs = squares - mean_offsets * sums
+        block.comoments = products - mean_offsets * sums.T
+        self.merge(block)
+
+    def merge(self, other):
+        """Combine the totals of another PairwiseCovariance into this one"""
+        if other.num_columns != self.num_columns:
+            raise ValueError("Cannot merge covariances of different columns")
+        counts = self.counts + other.counts
+        has_rows = counts > 0
+        delta = other.means - self.means
+        weight = np.divide(self.counts * other.counts, counts, out=np.zeros_like(counts), where=has_rows)
+
+        self.means = self.means + np.divide(delta * other.counts, counts, out=np.zeros_like(counts), where=has_rows)
+        self.sq_devs = self.sq_devs + other.sq_devs + delta ** 2 * weight
+        self.comoments = self.comoments + other.comoments + delta * delta.T * weight
+        self.counts = counts
+
+    def covariance(self) -> np.ndarray:
+        """Return the (p, p) sample covariance, NaN for pairs with under 2 rows"""
+        return np.divide(self.comoments, self.counts - 1,
+                         out=np.full(self.counts.shape, np.nan), where=self.counts > 1)
+
+    def correlation(self) -> np.ndarray:
+        """Return the (p, p) Pearson correlation, NaN where a column is constant"""
+        scale = np.sqrt(self.sq_devs * self.sq_devs.T)
+        return np.divide(self.comoments, scale,
+                         out=np.full(self.counts.shape, np.nan), where=scale > 0)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+# Writes synthetic daily USCRN files, one record per day, for testing and
+# benchmarking compute_stats2.py on files far larger than Data.txt. Records
+# are formatted with NumPy a block at a time, so 10^8 rows is practical.
+
+import sys
+import argparse
+
+import numpy as np
+
+import uscrn
+
+BLOCK_ROWS = 1 << 20
+
+# Dates repeat after 19 Gregorian 400 year cycles, so that very long files
+# stay within four digit years
+DATE_CYCLE_DAYS = 19 * 146097
+
+
+def format_field(values: np.ndarray, width: int, decimals: int) -> np.ndarray:
+    """Return an (n, width) array of the values as right aligned ASCII text"""
+    scaled = np.rint(np.abs(values) * 10 ** decimals).astype(np.int64)
+    negative = (values < 0) & (scaled > 0)
+
+    # Digits needed, at least one before the decimal point
+    num_digits = np.maximum(np.floor(np.log10(np.maximum(scaled, 1))).astype(np.int64) + 1, decimals + 1)
+    text_len = num_digits + (decimals > 0) + negative
+    if (text_len > width).any():
+        raise ValueError(f"Values do not fit in {width} characters")
+
+    out = np.full((len(values), width), ord(' '), dtype=np.uint8)
+    for pos in range(width):
+        # pos counts characters from the right, digit is the power of ten there
+        digit = pos - (decimals > 0 and pos > decimals)
+        col = width - 1 - pos
+        if decimals and pos == decimals:
+            out[:, col] = ord('.')
+            continue
+        is_digit = digit < num_digits
+        out[is_digit, col] = ord('0') + scaled[is_digit] // 10 ** digit % 10
+        is_sign = negative & (pos == text_len - 1)
+        out[is_sign, col] = ord('-')
+    return out
+
+
+def make_block(rng: np.random.Generator, first_day: int, rows: int, station: int,
+               missing: float) -> np.ndarray:
+    """Return rows records starting first_day days after 2000-01-01"""
+    stride = uscrn.FIELD_ENDS[-1] + 1
+    records = np.full((rows, stride), ord(' '), dtype=np.uint8)
+    records[:, -1] = ord('\n')
+
+    days = np.arange(first_day, first_day + rows)
+    dates = np.datetime64('2000-01-01') + days % DATE_CYCLE_DAYS
+    yyyymmdd = (dates.astype('datetime64[Y]').astype(np.int64) + 1970) * 10000 \
+        + (dates.astype('datetime64[M]').astype(np.int64) % 12 + 1) * 100 \
+        + (dates - dates.astype('datetime64[M]')).astype(np.int64) + 1
+
+    # Seasonal cycle plus day to day noise
+    season = np.cos(2 * np.pi * (days - 15) / 365.25)
+    mean_temp = -7.5 * season + 5 + rng.normal(0, 4, rows)
+    spread = rng.uniform(2, 12, rows)
+    humidity = rng.uniform(15, 60, rows)
+
+    fields = {
+        1: np.full(rows, station), 2: yyyymmdd, 3: np.full(rows, 2.423),
+        4: np.full(rows, -105.54), 5: np.full(rows, 40.04),
+        6: mean_temp + spread, 7: mean_temp - spread, 8: mean_temp, 9: mean_temp + rng.normal(0, 0.5, rows),
+        10: rng.exponential(2, rows) * (rng.random(rows) < 0.3), 11: rng.uniform(2, 30, rows),
+        13: mean_temp + spread * 2, 14: mean_temp - spread * 1.5, 15: mean_temp + 1,
+        16: np.minimum(humidity + 30, 100), 17: humidity - 10, 18: humidity + 10,
+    }
+    for column in range(19, 24):
+        fields[column] = rng.uniform(0.02, 0.4, rows)
+    for column in range(24, 29):
+        fields[column] = mean_temp * (0.9 - 0.15 * (column - 24)) + 3
+
+    for column, values in fields.items():
+        decimals = uscrn.FIELD_DECIMALS[column - 1]
+        # Measurements are missing as their field's sentinel, e.g. -9999.00 for solar radiation
+        if column in uscrn.MISSING_VALUES and missing:
+            values = np.where(rng.random(rows) < missing, float(uscrn.MISSING_VALUES[column]), values)
+        field = uscrn.field_range(column)
+        records[:, field] = format_field(values, field.stop - field.start, decimals)
+
+    records[:, uscrn.field_range(12)] = ord('C')
+    return records
+
+
+def write_file(out, rows: int, seed: int = 0, station: int = 94075, missing: float = 0.01):
+    """Write rows synthetic records to a binary file object"""
+    rng = np.random.default_rng(seed)
+    for start in range(0, rows, BLOCK_ROWS):
+        out.write(make_block(rng, start, min(BLOCK_ROWS, rows - start), station, missing).tobytes())
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Write a synthetic USCRN daily file.')
+
+    parser.add_argument('rows', type=int, metavar='<rows>',
+                        help='number of daily records, e.g. 1000 to 100000000')
+
+    parser.add_argument('fname', nargs='?', metavar='<fname>',
+                        help='file to write, standard output if omitted')
+
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the random values (default: %(default)s)')
+
+    parser.add_argument('--station', type=int, default=94075,
+                        help='WBANNO station number (default: %(default)s)')
+
+    parser.add_argument('--missing', type=float, default=0.01,
+                        help='fraction of measurements written as missing '
+                             '(default: %(default)s)')
+
+    args = parser.parse_args()
+    if args.rows < 0 or not 0 <= args.missing <= 1:
+        parser.error("rows must not be negative and missing must be between 0 and 1")
+
+    if args.fname is None:
+        write_file(sys.stdout.buffer, args.rows, args.seed, args.station, args.missing)
+    else:
+        with open(args.fname, 'wb') as out:
+            write_file(out, args.rows, args.seed, args.station, args.missing)
+
+
+if __name__ == '__main__':
+    main()
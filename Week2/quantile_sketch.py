@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+
+# Bounded-memory quantile estimation for streams that are too large to keep
+# in a list. Used by compute_stats2.py when running with --stream.
+
+import math
+
+import numpy as np
+
+
+class QuantileSketch:
+    """Log-bucketed quantile sketch with a relative error guarantee.
+
+    Every value x is counted in the bucket ceil(log_gamma(|x|)), where
+    gamma = (1 + a) / (1 - a) and a is the relative accuracy. A bucket is
+    reported by a representative value that is within a * |x| of every value
+    it holds, so the estimate returned by quantile(q) differs from the true
+    value at rank q * (n - 1) by at most a times the larger magnitude of the
+    two values either side of that rank.
+
+    Values with a magnitude below min_value are counted as zero. Memory is
+    bounded by max_buckets per sign; if a stream spans more buckets than that
+    the smallest magnitudes are collapsed together, and only quantiles that
+    fall in that collapsed range lose the guarantee.
+    """
+
+    def __init__(self, relative_accuracy=0.005, max_buckets=2048, min_value=1e-9):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.min_value = min_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def _index(self, magnitude):
+        return math.ceil(math.log(magnitude) / self._log_gamma)
+
+    def _value(self, index):
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def add(self, value):
+        """Count a single value in the sketch."""
+        self.count += 1
+        if value > self.min_value:
+            store = self.positive
+            idx = self._index(value)
+        elif value < -self.min_value:
+            store = self.negative
+            idx = self._index(-value)
+        else:
+            self.zero_count += 1
+            return
+
+        store[idx] = store.get(idx, 0) + 1
+        if len(store) > self.max_buckets:
+            self._collapse(store)
+
+    def add_array(self, values):
+        """Count every value of a NumPy array in the sketch."""
+        values = np.asarray(values, dtype=float)
+        self.count += len(values)
+        magnitudes = np.abs(values)
+        is_zero = magnitudes <= self.min_value
+        self.zero_count += int(is_zero.sum())
+
+        for store, selected in ((self.positive, values > self.min_value),
+                                (self.negative, values < -self.min_value)):
+            if not selected.any():
+                continue
+            indexes = np.ceil(np.log(magnitudes[selected]) / self._log_gamma).astype(np.int64)
+            for idx, n in zip(*np.unique(indexes, return_counts=True)):
+                store[int(idx)] = store.get(int(idx), 0) + int(n)
+            if len(store) > self.max_buckets:
+                self._collapse(store)
+
+    def _collapse(self, store):
+        """Fold the smallest magnitude buckets into one to bound memory."""
+        indexes = sorted(store)
+        excess = len(store) - self.max_buckets
+        target = indexes[excess]
+        for idx in indexes[:excess]:
+            store[target] += store.pop(idx)
+
+    def merge(self, other):
+        """Add the counts of another sketch with the same accuracy."""
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different accuracy")
+        for mine, theirs in ((self.positive, other.positive), (self.negative, other.negative)):
+            for idx, n in theirs.items():
+                mine[idx] = mine.get(idx, 0) + n
+            if len(mine) > self.max_buckets:
+                self._collapse(mine)
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def to_dict(self):
+        """Return the sketch as a dict that can be saved as JSON."""
+        return {'relative_accuracy': self.relative_accuracy,
+                'max_buckets': self.max_buckets,
+                'min_value': self.min_value,
+                'positive': {str(idx): n for idx, n in self.positive.items()},
+                'negative': {str(idx): n for idx, n in self.negative.items()},
+                'zero_count': self.zero_count,
+                'count': self.count}
+
+    @classmethod
+    def from_dict(cls, d):
+        """Return the sketch saved by to_dict()."""
+        sketch = cls(d['relative_accuracy'], d['max_buckets'], d['min_value'])
+        sketch.positive = {int(idx): n for idx, n in d['positive'].items()}
+        sketch.negative = {int(idx): n for idx, n in d['negative'].items()}
+        sketch.zero_count = d['zero_count']
+        sketch.count = d['count']
+        return sketch
+
+    def quantile(self, q):
+        """Return the estimated value at quantile q (0 <= q <= 1).
+
+        Between ranks the estimate is interpolated linearly, so the median of
+        an even number of values is the mean of the two middle estimates.
+        """
+        if not 0 <= q <= 1:
+            raise ValueError("Quantile must be between 0 and 1")
+        if self.count == 0:
+            return None
+
+        rank = q * (self.count - 1)
+        lower = self._value_at_rank(math.floor(rank))
+        if rank == math.floor(rank):
+            return lower
+        upper = self._value_at_rank(math.floor(rank) + 1)
+        return lower + (upper - lower) * (rank - math.floor(rank))
+
+    def _value_at_rank(self, rank):
+        """Return the representative value of the bucket holding rank."""
+        seen = 0
+
+        # Walk the buckets from the most negative value to the most positive
+        for idx in sorted(self.negative, reverse=True):
+            seen += self.negative[idx]
+            if seen > rank:
+                return -self._value(idx)
+
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+
+        for idx in sorted(self.positive):
+            seen += self.positive[idx]
+            if seen > rank:
+                return self._value(idx)
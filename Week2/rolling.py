@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+# Rolling min, max, mean and median over a fixed number of most recent
+# values, updated as each value arrives instead of recomputed per window.
+
+import heapq
+from collections import deque
+from typing import Optional, Tuple
+
+
+class RollingStats:
+    """Min, max, mean and median of the last `window` values pushed.
+
+    Missing values (None) take up a place in the window but are left out of
+    the statistics. Each push costs O(log window): min and max come from
+    monotonic deques, the mean from a running sum and the median from two
+    heaps whose removed values are discarded lazily.
+    """
+
+    def __init__(self, window: int):
+        if window < 1:
+            raise ValueError("Window must hold at least one value")
+        self.window = window
+        self.values = deque()
+        self.index = 0
+
+        # (index, value) pairs, increasing for the min and decreasing for the max
+        self._mins = deque()
+        self._maxs = deque()
+
+        self.count = 0
+        self.total = 0.0
+
+        # Lower half as a max-heap of negated values, upper half as a min-heap
+        self._low = []
+        self._high = []
+        self._low_size = 0
+        self._high_size = 0
+        self._removed = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def is_full(self) -> bool:
+        """Return True once the window holds `window` values"""
+        return len(self.values) == self.window
+
+    def push(self, value: Optional[float]):
+        """Add the newest value, dropping the oldest once the window is full"""
+        if len(self.values) == self.window:
+            self._drop(self.values.popleft())
+        self.values.append(value)
+        self.index += 1
+
+        # Entries that left the window fall off the front of the deques
+        oldest = self.index - self.window
+        while self._mins and self._mins[0][0] < oldest:
+            self._mins.popleft()
+        while self._maxs and self._maxs[0][0] < oldest:
+            self._maxs.popleft()
+
+        if value is None:
+            return
+
+        while self._mins and self._mins[-1][1] >= value:
+            self._mins.pop()
+        self._mins.append((self.index - 1, value))
+        while self._maxs and self._maxs[-1][1] <= value:
+            self._maxs.pop()
+        self._maxs.append((self.index - 1, value))
+
+        self.count += 1
+        self.total += value
+        self._add_median(value)
+
+    def _drop(self, value: Optional[float]):
+        if value is None:
+            return
+        self.count -= 1
+        self.total -= value
+        self._remove_median(value)
+
+    def _add_median(self, value: float):
+        if self._low_size == 0 or value <= -self._low[0]:
+            heapq.heappush(self._low, -value)
+            self._low_size += 1
+        else:
+            heapq.heappush(self._high, value)
+            self._high_size += 1
+        self._rebalance()
+
+    def _remove_median(self, value: float):
+        # The value is only marked, it leaves a heap when it reaches the top
+        self._removed[value] = self._removed.get(value, 0) + 1
+        if value <= -self._low[0]:
+            self._low_size -= 1
+            if value == -self._low[0]:
+                self._prune(self._low, -1)
+        else:
+            self._high_size -= 1
+            if self._high and value == self._high[0]:
+                self._prune(self._high, 1)
+        self._rebalance()
+
+        # Keep marked values from piling up in the heaps
+        if len(self._low) + len(self._high) > 2 * self.window:
+            self._rebuild()
+
+    def _prune(self, heap, sign):
+        while heap and self._removed.get(sign * heap[0]):
+            value = sign * heapq.heappop(heap)
+            self._removed[value] -= 1
+            if not self._removed[value]:
+                del self._removed[value]
+
+    def _rebalance(self):
+        if self._low_size > self._high_size + 1:
+            heapq.heappush(self._high, -heapq.heappop(self._low))
+            self._low_size -= 1
+            self._high_size += 1
+            self._prune(self._low, -1)
+        elif self._low_size < self._high_size:
+            heapq.heappush(self._low, -heapq.heappop(self._high))
+            self._low_size += 1
+            self._high_size -= 1
+            self._prune(self._high, 1)
+
+    def _rebuild(self):
+        current = sorted(value for value in self.values if value is not None)
+        half = (len(current) + 1) // 2
+        self._low = [-value for value in current[:half]]
+        self._high = current[half:]
+        heapq.heapify(self._low)
+        heapq.heapify(self._high)
+        self._low_size, self._high_size = len(self._low), len(self._high)
+        self._removed = {}
+
+    def median(self) -> Optional[float]:
+        """Return the median of the values in the window"""
+        if self.count == 0:
+            return None
+        if self._low_size > self._high_size:
+            return -self._low[0]
+        return (-self._low[0] + self._high[0]) / 2
+
+    def result(self) -> Tuple:
+        """Return min, max, average, and median of the window, like compute_stats"""
+        if self.count == 0:
+            return (None, None, None, None)
+        return (self._mins[0][1], self._maxs[0][1], self.total / self.count, self.median())
@@ -0,0 +1,55 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+import column_cache
+import uscrn
+
+# Run tests with python3 -m unittest -v test_column_cache.py
+
+class TestColumnCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.fname = os.path.join(self.tmpdir, "Data.txt")
+        shutil.copy("Data.txt", self.fname)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    # Cached columns are memory mapped and equal to the parsed ones
+    def test_load_columns(self):
+        expected = uscrn.read_columns(self.fname, [9, 19])
+        first = column_cache.load_columns(self.fname, [9, 19])
+        second = column_cache.load_columns(self.fname, [19, 9])
+        for column in (9, 19):
+            self.assertListEqual(first[column].tolist(), expected[column].tolist())
+            self.assertListEqual(second[column].tolist(), expected[column].tolist())
+        self.assertIsInstance(second[9].data.base, np.memmap)
+        self.assertTrue(os.path.exists(os.path.join(column_cache.cache_dir(self.fname), "field19.missing.npy")))
+
+    # A new mtime with the same contents keeps the cache
+    def test_touched_file(self):
+        column_cache.load_columns(self.fname, [9])
+        st = os.stat(self.fname)
+        os.utime(self.fname, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        meta_before = column_cache._read_meta(column_cache.cache_dir(self.fname))
+        column_cache.load_columns(self.fname, [9])
+        meta_after = column_cache._read_meta(column_cache.cache_dir(self.fname))
+        self.assertEqual(meta_before['sha256'], meta_after['sha256'])
+        self.assertEqual(meta_after['mtime_ns'], st.st_mtime_ns + 10**9)
+
+    # Changed contents of the same size are parsed again
+    def test_changed_file(self):
+        column_cache.load_columns(self.fname, [9, 10])
+        with open(self.fname, "r+b") as f:
+            f.seek(62)
+            f.write(b"   99.9")
+        st = os.stat(self.fname)
+        os.utime(self.fname, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        data = column_cache.load_columns(self.fname, [9])
+        self.assertEqual(data[9][0], 99.9)
+        meta = column_cache._read_meta(column_cache.cache_dir(self.fname))
+        self.assertListEqual(meta['columns'], [9])
+        self.assertFalse(os.path.exists(os.path.join(column_cache.cache_dir(self.fname), "field10.npy")))
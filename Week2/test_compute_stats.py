@@ -1,5 +1,14 @@
 import unittest
-from compute_stats2 import compute_stats
+import io
+import os
+import shutil
+import tempfile
+from contextlib import redirect_stderr
+import numpy as np
+from compute_stats2 import compute_stats, compute_quantiles, analyze, analyze_fixed_width, parse_columns, RunningStats, \
+    analyze_files, expand_files, file_partials, analyze_rolling, analyze_incremental, \
+    analyze_groups, analyze_groups_fixed_width, group_key, group_name, \
+    covariance, covariance_fixed_width
 
 # Run tests with python3 -m unittest -v test_compute_stats.p
 
@@ -36,3 +45,291 @@ class TestComputeStates(unittest.TestCase):
         test_list = [1,2,"three",4]
         with self.assertRaises(TypeError):
             compute_stats(test_list)
+
+    # Test list that is not sorted
+    def test_unsorted_list(self):
+        test_list = [15, 3, 21, 9, 5]
+        expected_result = (3, 21, 10.6, 9)
+        ret = compute_stats(test_list)
+        self.assertTupleEqual(ret, expected_result)
+
+
+class TestComputeQuantiles(unittest.TestCase):
+
+    # Test empty list as input
+    def test_empty_list(self):
+        self.assertListEqual(compute_quantiles([], [0.05, 0.5]), [None, None])
+
+    # Quantiles are interpolated between ranks of the unsorted values
+    def test_quantiles(self):
+        test_list = [7, 2, 6, 3, 5, 4]
+        ret = compute_quantiles(test_list, [0, 0.25, 0.5, 0.95, 1])
+        self.assertListEqual(ret, [2, 3.25, 4.5, 6.75, 7])
+
+    # Input list is left as it was given
+    def test_input_unchanged(self):
+        test_list = [3, 1, 2]
+        compute_quantiles(test_list, [0.5])
+        self.assertListEqual(test_list, [3, 1, 2])
+
+    # Test quantile outside of [0, 1]
+    def test_invalid_quantile(self):
+        with self.assertRaises(ValueError):
+            compute_quantiles([1, 2, 3], [1.5])
+
+
+class TestRunningStats(unittest.TestCase):
+
+    # Empty stream matches compute_stats on an empty list
+    def test_empty_stream(self):
+        self.assertTupleEqual(RunningStats().result(), (None, None, None, None))
+
+    # Min, max and average are exact, median within the sketch accuracy
+    def test_unsorted_stream(self):
+        test_list = [15, 3, 21, 9, 5]
+        stats = RunningStats()
+        for num in test_list:
+            stats.add(num)
+        o_min, o_max, o_avg, o_median = stats.result()
+        self.assertEqual((o_min, o_max), (3, 21))
+        self.assertAlmostEqual(o_avg, 10.6)
+        self.assertAlmostEqual(o_median, 9, delta=9 * 0.005)
+
+    # Merging two halves gives the same result as one stream
+    def test_merge(self):
+        left, right, both = RunningStats(), RunningStats(), RunningStats()
+        for num in range(-50, 51):
+            (left if num < 0 else right).add(num)
+            both.add(num)
+        left.merge(right)
+        self.assertTupleEqual(left.result(), both.result())
+
+    # Streaming the sample file agrees with the sorted computation
+    def test_stream_matches_sorted(self):
+        with open("Data.txt") as f:
+            (exact, _), = analyze(f, [9])
+        with open("Data.txt") as f:
+            (approx, _), = analyze(f, [9], stream=True)
+        self.assertEqual(exact[0:2], approx[0:2])
+        self.assertAlmostEqual(exact[2], approx[2])
+        self.assertAlmostEqual(exact[3], approx[3], delta=abs(exact[3]) * 0.005)
+
+    # Adding an array gives the same result as adding its values one at a time
+    def test_add_array(self):
+        values = [4.5, -3.0, 0.0, 12.25, -0.5]
+        one, many = RunningStats(), RunningStats()
+        for num in values:
+            one.add(num)
+        many.add_array(np.array(values))
+        self.assertTupleEqual(one.result(), many.result())
+
+
+class TestAnalyze(unittest.TestCase):
+
+    lines = [
+        "1 -9999.0   2.5",
+        "2     4.0 -99.000",
+        "3     6.0   1.5",
+    ]
+
+    # Each column skips only its own missing values
+    def test_columns_missing_values(self):
+        results = analyze(self.lines, [1, 2, 3])
+        self.assertTupleEqual(results[0][0], (1, 3, 2, 2))
+        self.assertTupleEqual(results[1][0], (4, 6, 5, 5))
+        self.assertTupleEqual(results[2][0], (1.5, 2.5, 2, 2))
+
+    # Streaming gives the same exact min, max and average per column
+    def test_columns_stream(self):
+        exact = analyze(self.lines, [2, 3], qs=[0.5])
+        approx = analyze(self.lines, [2, 3], stream=True, qs=[0.5])
+        for (e_stats, e_qs), (a_stats, a_qs) in zip(exact, approx):
+            self.assertTupleEqual(e_stats[0:3], a_stats[0:3])
+            self.assertAlmostEqual(e_qs[0], a_qs[0], delta=abs(e_qs[0]) * 0.005)
+
+    # The memory mapped reader gives the same results as csv.reader
+    def test_fixed_width(self):
+        with open("Data.txt") as f:
+            expected = analyze(f, [9, 10, 11, 20], qs=[0.05, 0.95])
+        results = analyze_fixed_width("Data.txt", [9, 10, 11, 20], qs=[0.05, 0.95])
+        for (e_stats, e_qs), (stats, qs) in zip(expected, results):
+            self.assertListEqual(list(e_stats[0:2]) + e_qs, list(stats[0:2]) + qs)
+            self.assertAlmostEqual(e_stats[2], stats[2])
+            self.assertAlmostEqual(e_stats[3], stats[3])
+
+    # Solar radiation is F8.2 and marks a missing value with -9999.00
+    def test_solar_radiation_missing(self):
+        with open("Data.txt") as f:
+            (by_csv, _), = analyze(f, [11])
+        (by_mmap, _), = analyze_fixed_width("Data.txt", [11])
+        self.assertGreater(by_csv[0], -9999)
+        self.assertTupleEqual(by_csv[0:2], by_mmap[0:2])
+        self.assertLess(covariance_fixed_width("Data.txt", [11]).covariance()[0, 0], 1000)
+
+    # One row per line, empty until each window has filled up
+    def test_rolling(self):
+        lines = ["1 20180101 4.0", "1 20180102 -9999.0", "1 20180103 1.0"]
+        rows = list(analyze_rolling(lines, [3], [1, 2]))
+        self.assertListEqual([date for date, _ in rows], ["20180101", "20180102", "20180103"])
+        self.assertListEqual(rows[0][1], [(4.0, 4.0, 4.0, 4.0), (None, None, None, None)])
+        self.assertListEqual(rows[1][1], [(None, None, None, None), (4.0, 4.0, 4.0, 4.0)])
+        self.assertListEqual(rows[2][1], [(1.0, 1.0, 1.0, 1.0), (1.0, 1.0, 1.0, 1.0)])
+
+    # Column numbers optionally followed by a file name
+    def test_parse_columns(self):
+        self.assertTupleEqual(parse_columns(["8", "9", "10"]), ([8, 9, 10], None))
+        self.assertTupleEqual(parse_columns(["9", "Data.txt"]), ([9], "Data.txt"))
+        for items in (["Data.txt"], ["9", "Data.txt", "10"], ["0"]):
+            with self.subTest(items=items):
+                with self.assertRaises(ValueError):
+                    parse_columns(items)
+        self.assertTupleEqual(parse_columns(["Data.txt"], require_columns=False), ([], "Data.txt"))
+
+    # Both engines give the same covariance, skipping the sentinels
+    def test_covariance(self):
+        with open("Data.txt") as f:
+            by_csv = covariance(f, [9, 10, 19])
+        by_mmap = covariance_fixed_width("Data.txt", [9, 10, 19])
+        np.testing.assert_array_equal(by_csv.counts, by_mmap.counts)
+        np.testing.assert_allclose(by_csv.covariance(), by_mmap.covariance())
+        with open("Data.txt") as f:
+            soil_moisture = [line.split()[18] for line in f]
+        self.assertEqual(by_csv.counts[2, 2], len(soil_moisture) - soil_moisture.count("-99.000"))
+
+
+class TestAnalyzeFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        for name in ("a.txt", "b.txt"):
+            shutil.copy("Data.txt", os.path.join(self.tmpdir, name))
+        with open("Data.txt") as f, open(os.path.join(self.tmpdir, "c.txt"), "w") as out:
+            out.writelines("12345" + line[5:] for line in f)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    # Directories and globs expand to their files, in order
+    def test_expand_files(self):
+        names = [os.path.basename(f) for f in expand_files(self.tmpdir)]
+        self.assertListEqual(names, ["a.txt", "b.txt", "c.txt"])
+
+        # The state of --follow and the --cache directories are not data files
+        analyze_incremental(os.path.join(self.tmpdir, "a.txt"), [9])
+        file_partials(os.path.join(self.tmpdir, "b.txt"), [9], engine="mmap", cache=True)
+        names = [os.path.basename(f) for f in expand_files(self.tmpdir)]
+        self.assertListEqual(names, ["a.txt", "b.txt", "c.txt"])
+        names = [os.path.basename(f) for f in expand_files(os.path.join(self.tmpdir, "a.txt*"))]
+        self.assertListEqual(names, ["a.txt"])
+        names = [os.path.basename(f) for f in expand_files(os.path.join(self.tmpdir, "[ab].txt"))]
+        self.assertListEqual(names, ["a.txt", "b.txt"])
+
+    # Both engines give the same partial aggregates per station
+    def test_file_partials(self):
+        fname = os.path.join(self.tmpdir, "a.txt")
+        by_csv = file_partials(fname, [9, 10])
+        by_mmap = file_partials(fname, [9, 10], engine='mmap')
+        self.assertListEqual(list(by_csv), ["94075"])
+        self.assertListEqual(list(by_mmap), ["94075"])
+        for csv_stats, mmap_stats in zip(by_csv["94075"], by_mmap["94075"]):
+            self.assertEqual(csv_stats.count, mmap_stats.count)
+            self.assertEqual((csv_stats.min, csv_stats.max), (mmap_stats.min, mmap_stats.max))
+            self.assertAlmostEqual(csv_stats.total, mmap_stats.total)
+
+    # Zero padded station numbers keep their leading zeros with either engine
+    def test_zero_padded_station(self):
+        fname = os.path.join(self.tmpdir, "d.txt")
+        with open("Data.txt") as f, open(fname, "w") as out:
+            out.writelines("03047" + line[5:] for line in f)
+        for engine in ('csv', 'mmap'):
+            with self.subTest(engine=engine):
+                self.assertListEqual(list(file_partials(fname, [9], engine=engine)), ["03047"])
+
+    # Partials merge per station and overall, whatever the number of workers
+    def test_analyze_files(self):
+        fnames = expand_files(self.tmpdir)
+        stations, overall = analyze_files(fnames, [9], workers=1)
+        pooled_stations, pooled_overall = analyze_files(fnames, [9], workers=2)
+        self.assertEqual(stations["94075"][0].count, 2 * stations["12345"][0].count)
+        self.assertEqual(overall[0].count, 3 * stations["12345"][0].count)
+        self.assertTupleEqual(overall[0].result(), pooled_overall[0].result())
+        self.assertTupleEqual(stations["12345"][0].result(), pooled_stations["12345"][0].result())
+
+
+class TestAnalyzeIncremental(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.fname = os.path.join(self.tmpdir, "Data.txt")
+        with open("Data.txt") as f:
+            self.lines = f.readlines()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def append(self, text):
+        with open(self.fname, "a") as f:
+            f.write(text)
+
+    # Reading in pieces, even mid-line, matches one streaming pass
+    def test_appended_lines(self):
+        with open("Data.txt") as f:
+            expected = analyze(f, [9, 10], stream=True)
+        self.append("".join(self.lines[:100]))
+        analyze_incremental(self.fname, [9, 10])
+        self.append("".join(self.lines[100:200]) + self.lines[200][:50])
+        partial = analyze_incremental(self.fname, [9, 10])
+        self.assertEqual(partial[0][0], analyze(self.lines[:200], [9], stream=True)[0][0])
+        self.append(self.lines[200][50:] + "".join(self.lines[201:]))
+        self.assertEqual(analyze_incremental(self.fname, [9, 10]), expected)
+
+    # A changed file or different columns start over from the beginning
+    def test_rebuild(self):
+        self.append("".join(self.lines[:100]))
+        analyze_incremental(self.fname, [9])
+        with open(self.fname, "w") as f:
+            f.write("".join(self.lines[100:300]))
+        with redirect_stderr(io.StringIO()) as err:
+            results = analyze_incremental(self.fname, [9])
+        self.assertIn("does not match", err.getvalue())
+        self.assertEqual(results, analyze(self.lines[100:300], [9], stream=True))
+
+        with redirect_stderr(io.StringIO()) as err:
+            results = analyze_incremental(self.fname, [10])
+        self.assertIn("does not match", err.getvalue())
+        self.assertEqual(results, analyze(self.lines[100:300], [10], stream=True))
+
+
+class TestGroupBy(unittest.TestCase):
+
+    # Keys sort in calendar order, December joins the next winter
+    def test_group_key(self):
+        self.assertEqual(group_key(20180315, 'year'), 201800)
+        self.assertEqual(group_key(20180315, 'month'), 201803)
+        self.assertEqual(group_name(group_key(20180115, 'season'), 'season'), "2018-DJF")
+        self.assertEqual(group_name(group_key(20181215, 'season'), 'season'), "2019-DJF")
+        self.assertEqual(group_name(group_key(20180601, 'season'), 'season'), "2018-JJA")
+        self.assertEqual(group_name(group_key(20181130, 'season'), 'season'), "2018-SON")
+
+    # Each group matches the stats of its own lines
+    def test_months(self):
+        with open("Data.txt") as f:
+            lines = f.readlines()
+        groups = analyze_groups(lines, [9], 'month')
+        self.assertEqual(len(groups), 12)
+        january = [line for line in lines if line[6:12] == "201801"]
+        (expected, _), = analyze(january, [9], stream=True)
+        # The stream adds up values a block at a time, so only in a different order
+        for value, expected_value in zip(groups[201801][0].result(), expected):
+            self.assertAlmostEqual(value, expected_value)
+
+    # Both engines find the same groups and counts
+    def test_fixed_width(self):
+        with open("Data.txt") as f:
+            by_csv = analyze_groups(f, [9, 19], 'season')
+        by_mmap = analyze_groups_fixed_width("Data.txt", [9, 19], 'season')
+        self.assertListEqual(sorted(by_csv), sorted(by_mmap))
+        for key in by_csv:
+            for csv_stats, mmap_stats in zip(by_csv[key], by_mmap[key]):
+                self.assertEqual(csv_stats.count, mmap_stats.count)
+                self.assertEqual(csv_stats.min, mmap_stats.min)
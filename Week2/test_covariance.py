@@ -0,0 +1,50 @@
+import unittest
+import numpy as np
+from covariance import PairwiseCovariance
+
+# Run tests with python3 -m unittest -v test_covariance.py
+
+class TestPairwiseCovariance(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(3006)
+        self.values = rng.normal(size=(500, 3)) * [1, 10, 0.1] + [5, -30, 1e6]
+        self.values[:, 1] += 4 * self.values[:, 0]
+        self.missing = rng.random(self.values.shape) < 0.2
+
+    # Every pair matches numpy on the rows where both columns have values
+    def test_pairwise_complete(self):
+        cov = PairwiseCovariance(3)
+        for start in range(0, 500, 64):
+            cov.add_block(self.values[start:start + 64], self.missing[start:start + 64])
+
+        for i in range(3):
+            for j in range(3):
+                with self.subTest(i=i, j=j):
+                    rows = ~self.missing[:, i] & ~self.missing[:, j]
+                    self.assertEqual(cov.counts[i, j], rows.sum())
+                    expected = np.cov(self.values[rows, i], self.values[rows, j])[0, 1]
+                    self.assertAlmostEqual(cov.covariance()[i, j], expected)
+                    expected = np.corrcoef(self.values[rows, i], self.values[rows, j])[0, 1]
+                    self.assertAlmostEqual(cov.correlation()[i, j], expected)
+
+    # Merging the halves gives the same matrices as one pass
+    def test_merge(self):
+        whole, first, second = PairwiseCovariance(3), PairwiseCovariance(3), PairwiseCovariance(3)
+        whole.add_block(self.values, self.missing)
+        first.add_block(self.values[:123], self.missing[:123])
+        second.add_block(self.values[123:], self.missing[123:])
+        first.merge(second)
+        np.testing.assert_allclose(first.covariance(), whole.covariance())
+        np.testing.assert_allclose(first.correlation(), whole.correlation())
+
+    # Pairs without enough rows, or with a constant column, are NaN
+    def test_undefined(self):
+        cov = PairwiseCovariance(3)
+        values = np.array([[1.0, 2.0, 3.0], [2.0, 2.0, 5.0]])
+        cov.add_block(values, np.array([[False, False, True], [False, False, True]]))
+        self.assertAlmostEqual(cov.covariance()[0, 0], 0.5)
+        self.assertTrue(np.isnan(cov.correlation()[0, 1]))
+        self.assertTrue(np.isnan(cov.covariance()[0, 2]))
+        with self.assertRaises(ValueError):
+            cov.merge(PairwiseCovariance(2))
@@ -0,0 +1,50 @@
+import unittest
+import io
+import os
+import tempfile
+import numpy as np
+import make_uscrn
+import uscrn
+
+# Run tests with python3 -m unittest -v test_make_uscrn.py
+
+class TestMakeUSCRN(unittest.TestCase):
+
+    # Values are right aligned with a fixed number of decimals
+    def test_format_field(self):
+        values = np.array([-3.94, 0.0, 12.25, -0.06, -0.04, -9999.0])
+        text = make_uscrn.format_field(values, 7, 1)
+        self.assertListEqual([bytes(row) for row in text],
+                             [b"   -3.9", b"    0.0", b"   12.2", b"   -0.1", b"    0.0", b"-9999.0"])
+        text = make_uscrn.format_field(np.array([20180101, 5]), 8, 0)
+        self.assertListEqual([bytes(row) for row in text], [b"20180101", b"       5"])
+        with self.assertRaises(ValueError):
+            make_uscrn.format_field(np.array([123.45]), 4, 2)
+
+    # Generated files read back as USCRN records with consecutive dates
+    def test_write_file(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fname = os.path.join(tmpdir, "synthetic.txt")
+            with open(fname, "wb") as out:
+                make_uscrn.write_file(out, 400, seed=1, missing=0.1)
+            self.assertEqual(os.path.getsize(fname), 400 * (uscrn.FIELD_ENDS[-1] + 1))
+            data = uscrn.read_columns(fname, [2, 9, 11, 19])
+            with open(fname, "rb") as f:
+                solar = [line[uscrn.field_range(11)] for line in f]
+
+        self.assertEqual(data[2][0], 20000101)
+        self.assertEqual(data[2][366], 20010101)
+        self.assertTrue(0 < data[9].mask.sum() < 100)
+        self.assertTrue(0 < data[19].mask.sum() < 100)
+
+        # Solar radiation is missing as -9999.00, the sentinel of its F8.2 format
+        self.assertTrue(0 < solar.count(b"-9999.00") < 100)
+        self.assertEqual(data[11].mask.sum(), solar.count(b"-9999.00"))
+        self.assertGreater(data[11].min(), 0)
+
+    # The same seed writes the same file
+    def test_seed(self):
+        first, second = io.BytesIO(), io.BytesIO()
+        make_uscrn.write_file(first, 50, seed=7)
+        make_uscrn.write_file(second, 50, seed=7)
+        self.assertEqual(first.getvalue(), second.getvalue())
@@ -0,0 +1,60 @@
+import unittest
+import random
+import json
+from quantile_sketch import QuantileSketch
+
+# Run tests with python3 -m unittest -v test_quantile_sketch.py
+
+class TestQuantileSketch(unittest.TestCase):
+
+    # Empty sketch has no quantiles
+    def test_empty(self):
+        self.assertIsNone(QuantileSketch().quantile(0.5))
+
+    # Every quantile is within the relative accuracy of the true value
+    def test_relative_error(self):
+        rng = random.Random(3006)
+        values = [rng.gauss(0, 20) for _ in range(5000)] + [0.0] * 100
+        sketch = QuantileSketch(relative_accuracy=0.01)
+        for value in values:
+            sketch.add(value)
+        values.sort()
+        for q in (0, 0.05, 0.25, 0.5, 0.75, 0.95, 1):
+            with self.subTest(q=q):
+                expected = values[int(q * (len(values) - 1))]
+                self.assertAlmostEqual(sketch.quantile(q), expected, delta=abs(expected) * 0.01)
+
+    # Merged sketches answer the same as a single sketch of all the values
+    def test_merge(self):
+        left, right, both = QuantileSketch(), QuantileSketch(), QuantileSketch()
+        for num in range(1, 1001):
+            (left if num % 2 else right).add(num)
+            both.add(num)
+        left.merge(right)
+        self.assertEqual(len(left), 1000)
+        self.assertEqual(left.quantile(0.5), both.quantile(0.5))
+
+    # Memory stays bounded however wide the range of values
+    def test_bounded_buckets(self):
+        sketch = QuantileSketch(max_buckets=50)
+        for exponent in range(-5, 6):
+            for num in range(1, 100):
+                sketch.add(num * 10.0 ** exponent)
+        self.assertLessEqual(len(sketch.positive), 50)
+        self.assertAlmostEqual(sketch.quantile(1), 99e5, delta=99e5 * 0.005)
+
+    # A sketch saved as JSON comes back unchanged
+    def test_to_dict(self):
+        sketch = QuantileSketch()
+        for num in (-3.5, 0, 2, 2, 40):
+            sketch.add(num)
+        restored = QuantileSketch.from_dict(json.loads(json.dumps(sketch.to_dict())))
+        self.assertEqual(restored.to_dict(), sketch.to_dict())
+        self.assertEqual(restored.quantile(0.25), sketch.quantile(0.25))
+
+    # Invalid arguments are rejected
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            QuantileSketch(relative_accuracy=1)
+        with self.assertRaises(ValueError):
+            QuantileSketch().quantile(1.5)
@@ -0,0 +1,48 @@
+import unittest
+import random
+from compute_stats2 import compute_stats
+from rolling import RollingStats
+
+# Run tests with python3 -m unittest -v test_rolling.py
+
+class TestRollingStats(unittest.TestCase):
+
+    # Every window agrees with compute_stats on the same values
+    def test_matches_compute_stats(self):
+        rng = random.Random(3006)
+        series = [None if rng.random() < 0.1 else rng.randint(-20, 20) / 2 for _ in range(1000)]
+        for window in (1, 2, 7, 30):
+            rolling = RollingStats(window)
+            for i, value in enumerate(series):
+                rolling.push(value)
+                current = [v for v in series[max(0, i + 1 - window):i + 1] if v is not None]
+                with self.subTest(window=window, i=i):
+                    expected = compute_stats(current)
+                    result = rolling.result()
+                    self.assertEqual(result[0:2], expected[0:2])
+                    self.assertEqual(result[3], expected[3])
+                    if expected[2] is not None:
+                        self.assertAlmostEqual(result[2], expected[2])
+
+    # Window fills up before it starts dropping values
+    def test_is_full(self):
+        rolling = RollingStats(3)
+        for value in (1, 2):
+            rolling.push(value)
+            self.assertFalse(rolling.is_full())
+        rolling.push(None)
+        self.assertTrue(rolling.is_full())
+        self.assertTupleEqual(rolling.result(), (1, 2, 1.5, 1.5))
+
+    # A window of missing values has no statistics
+    def test_all_missing(self):
+        rolling = RollingStats(2)
+        rolling.push(4.0)
+        rolling.push(None)
+        rolling.push(None)
+        self.assertTupleEqual(rolling.result(), (None, None, None, None))
+
+    # Test window that cannot hold any values
+    def test_invalid_window(self):
+        with self.assertRaises(ValueError):
+            RollingStats(0)
@@ -0,0 +1,48 @@
+import unittest
+import csv
+import numpy as np
+import uscrn
+
+# Run tests with python3 -m unittest -v test_uscrn.py
+
+class TestUSCRN(unittest.TestCase):
+
+    # Parsed values match float() of every field, sentinels are masked
+    def test_matches_csv_reader(self):
+        columns = [1, 2, 8, 9, 10, 11, 19, 28]
+        data = uscrn.read_columns("Data.txt", columns)
+        with open("Data.txt") as f:
+            rows = list(csv.reader(f, delimiter=' ', skipinitialspace=True))
+
+        for column in columns:
+            with self.subTest(column=column):
+                expected = [None if row[column - 1] in uscrn.missing_values(column) else float(row[column - 1])
+                            for row in rows]
+                self.assertListEqual(data[column].tolist(), expected)
+
+    # Field ranges match the 'cut -c63-69' used for the average temperature
+    def test_field_range(self):
+        self.assertEqual(uscrn.field_range(9), slice(62, 69))
+        self.assertEqual(uscrn.field_range(1), slice(0, 5))
+        with self.assertRaises(ValueError):
+            uscrn.field_range(29)
+
+    # Parsing handles signs, missing decimal points and padding
+    def test_parse_field(self):
+        fields = [b"  -3.9", b"   0.0", b" 94075", b"-0.045", b"   -12"]
+        array = np.frombuffer(b"".join(fields), dtype=np.uint8).reshape(len(fields), -1)
+        self.assertListEqual(uscrn.parse_field(array).tolist(), [-3.9, 0.0, 94075, -0.045, -12])
+
+    # Blocks cover every record once
+    def test_iter_blocks(self):
+        blocks = list(uscrn.iter_blocks("Data.txt", [9], block_rows=100))
+        self.assertEqual(len(blocks), 4)
+        joined = np.ma.concatenate([block[9] for block in blocks])
+        self.assertListEqual(joined.tolist(), uscrn.read_columns("Data.txt", [9])[9].tolist())
+
+    # Flag fields and files that are not fixed width are rejected
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            uscrn.read_columns("Data.txt", [12])
+        with self.assertRaises(ValueError):
+            uscrn.read_columns("uscrn.py", [9])
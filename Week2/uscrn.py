@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+
+# Reads columns of fixed-width USCRN daily files straight into NumPy arrays.
+# The file is memory mapped and every field is sliced out of all records at
+# once, so no Python code runs per line.
+
+import mmap
+from typing import Dict, Iterator, Sequence, Tuple
+
+import numpy as np
+
+# Last character (1-based) of each of the 28 fields of a USCRN daily record.
+# Every field starts two characters after the end of the previous one.
+FIELD_ENDS = (5, 14, 21, 29, 37, 45, 53, 61, 69, 77, 86, 88, 96, 104,
+              112, 120, 128, 136, 144, 152, 160, 168, 176, 184, 192, 200, 208, 216)
+
+# Fields holding measurements; 1 to 5 identify the station and day and
+# 12 is the surface temperature type flag
+MEASUREMENT_FIELDS = tuple(column for column in range(6, len(FIELD_ENDS) + 1) if column != 12)
+
+# Decimal places of each field, and None for the flag field
+FIELD_DECIMALS = (0, 0, 3, 2, 2, 1, 1, 1, 1, 1, 2, None, 1, 1, 1,
+                  1, 1, 1, 3, 3, 3, 3, 3, 1, 1, 1, 1, 1)
+
+
+def _sentinel(column: int) -> str:
+    """Return the missing value of a field: a minus, then nines up to the decimal point
+
+    This gives -9999.0 for the F7.1 fields, -9999.00 for the F8.2 solar
+    radiation and -99.000 for the F7.3 soil moisture.
+    """
+    width = FIELD_ENDS[column - 1] - FIELD_ENDS[column - 2] - 1
+    decimals = FIELD_DECIMALS[column - 1]
+    return '-' + '9' * (width - decimals - 2) + '.' + '0' * decimals
+
+
+# Value USCRN uses to mark a missing measurement, for each measurement field
+MISSING_VALUES = {column: _sentinel(column) for column in MEASUREMENT_FIELDS}
+
+# Any of them, for columns that are not a USCRN measurement field
+ALL_MISSING_VALUES = tuple(sorted(set(MISSING_VALUES.values())))
+
+_DIGIT, _MINUS, _POINT, _SPACE = ord('0'), ord('-'), ord('.'), ord(' ')
+
+
+def field_range(column: int) -> slice:
+    """Return the byte range within a record of a field, numbered from 1"""
+    if not 1 <= column <= len(FIELD_ENDS):
+        raise ValueError(f"USCRN records have fields 1 to {len(FIELD_ENDS)}, not {column}")
+    start = FIELD_ENDS[column - 2] + 1 if column > 1 else 0
+    return slice(start, FIELD_ENDS[column - 1])
+
+
+def parse_field(field: np.ndarray, column: int = None) -> np.ndarray:
+    """Convert an (n, width) array of ASCII bytes into n floats.
+
+    The digits are combined into an exact integer mantissa and divided by
+    the matching power of ten, which rounds the same way as float() does.
+    """
+    valid = ((field >= _DIGIT) & (field <= _DIGIT + 9)) | (field == _MINUS) \
+        | (field == _POINT) | (field == _SPACE)
+    if not valid.all():
+        raise ValueError(f"Field {column} is not numeric")
+
+    is_digit = (field >= _DIGIT) & (field <= _DIGIT + 9)
+    digits = np.where(is_digit, field - _DIGIT, 0).astype(np.int64)
+
+    # Power of ten of each digit, counting digits from the right
+    exponents = np.cumsum(is_digit[:, ::-1], axis=1)[:, ::-1] - 1
+    mantissa = (digits * 10 ** np.maximum(exponents, 0)).sum(axis=1)
+
+    # Number of digits after the decimal point
+    width = field.shape[1]
+    has_point = (field == _POINT).any(axis=1)
+    point = np.where(has_point, np.argmax(field == _POINT, axis=1), width)
+    decimals = (is_digit & (np.arange(width) > point[:, None])).sum(axis=1)
+
+    values = mantissa / 10.0 ** decimals
+    return np.where((field == _MINUS).any(axis=1), -values, values)
+
+
+def missing_values(column: int) -> Tuple[str, ...]:
+    """Return the text of a missing value in a column, numbered from 1
+
+    A USCRN measurement field has a single sentinel that depends on its
+    width and decimals. Any other column, e.g. of a file that is not
+    USCRN, is missing when it holds any of the sentinels.
+    """
+    if column in MISSING_VALUES:
+        return (MISSING_VALUES[column],)
+    return ALL_MISSING_VALUES
+
+
+def missing_mask(field: np.ndarray, column: int = None) -> np.ndarray:
+    """Return True for every row of an (n, width) field holding a sentinel"""
+    mask = np.zeros(field.shape[0], dtype=bool)
+    for sentinel in missing_values(column):
+        if len(sentinel) <= field.shape[1]:
+            padded = np.frombuffer(sentinel.encode().rjust(field.shape[1]), dtype=np.uint8)
+            mask |= (field == padded).all(axis=1)
+    return mask
+
+
+class FixedWidthFile:
+    """Memory mapped USCRN file viewed as an (records, stride) byte array.
+
+    Use as a context manager so that the mapping is closed afterwards.
+    """
+
+    def __init__(self, fname: str):
+        self.fname = fname
+        self._file = open(fname, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            self._map = None
+        buffer = np.frombuffer(self._map, dtype=np.uint8) if self._map else np.zeros(0, dtype=np.uint8)
+
+        # Records are as long as the first line, and all must end in a newline
+        newlines = np.flatnonzero(buffer[:FIELD_ENDS[-1] * 2] == ord('\n'))
+        self.stride = int(newlines[0]) + 1 if len(newlines) else FIELD_ENDS[-1] + 1
+        if len(buffer) % self.stride or self.stride <= FIELD_ENDS[-1]:
+            self.close()
+            raise ValueError(f"{fname} is not a fixed-width USCRN file")
+        self.records = buffer.reshape(-1, self.stride)
+        if not (self.records[:, -1] == ord('\n')).all():
+            self.close()
+            raise ValueError(f"{fname} is not a fixed-width USCRN file")
+
+    def __len__(self):
+        return self.records.shape[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        # Drop the array views first, the map cannot close while they exist
+        self.records = None
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # Views are still held by a traceback, the mapping is
+                # released once they are garbage collected
+                pass
+        self._file.close()
+
+    def read(self, columns: Sequence[int], start: int = 0, stop: int = None) -> Dict[int, np.ma.MaskedArray]:
+        """Return a masked array for each column of records start to stop"""
+        block = self.records[start:stop]
+        result = {}
+        for column in columns:
+            field = block[:, field_range(column)]
+            mask = missing_mask(field, column)
+            values = parse_field(field, column)
+            result[column] = np.ma.MaskedArray(values, mask)
+        return result
+
+
+def read_columns(fname: str, columns: Sequence[int]) -> Dict[int, np.ma.MaskedArray]:
+    """Return every value of the given columns (numbered from 1) of a file
+
+    Missing values are masked.
+    """
+    with FixedWidthFile(fname) as f:
+        return f.read(columns)
+
+
+def iter_blocks(fname: str, columns: Sequence[int], block_rows: int = 65536) -> Iterator[Dict[int, np.ma.MaskedArray]]:
+    """Yield the given columns of a file block_rows records at a time"""
+    with FixedWidthFile(fname) as f:
+        for start in range(0, len(f), block_rows):
+            yield f.read(columns, start, start + block_rows)
+
@@ -1,13 +1,58 @@
 #!/usr/bin/env python3
 
 import sys
+import json
+import time
 import random
+import pstats
+import cProfile
+from collections import defaultdict
 
+from operator import length_hint
+
+import numpy as np
+
+# Hands played at once by the batch engine
+BATCH_SIZE = 1 << 20
+
+# Functions whose own time --stats adds up for each part of playing a hand,
+# when the run is also profiled with --profile. '<listcomp>' is the
+# comprehension in score(), which only has its own entry before Python 3.12,
+# when comprehensions became part of their function.
+STATS_FUNCTIONS = {'score': ('score', '<listcomp>'), 'stand': ('stand',),
+                   'get_card': ('get_card', '_cards')}
 
 def get_card():
     """Return a card value between 1 and 13"""
     return random.randint(1, 13)
 
+class CardSource:
+    """Cards between 1 and 13 drawn from blocks of pre-generated random numbers
+
+    Drawing a card is a single call to the next() of an iterator over the
+    current block, much cheaper than random.randint. The same seed always
+    gives the same cards. The cards dealt are counted by block, so counting
+    them costs nothing per card.
+    """
+
+    def __init__(self, seed=None, block_size=1 << 16):
+        self.rng = np.random.default_rng(seed)
+        self.block_size = block_size
+        self._num_blocks = 0
+        self._block_cards = iter(())
+        self.get_card = self._cards().__next__
+
+    def _cards(self):
+        while True:
+            self._block_cards = iter(self.rng.integers(1, 14, size=self.block_size).tolist())
+            self._num_blocks += 1
+            yield from self._block_cards
+
+    @property
+    def cards(self):
+        """Number of cards dealt so far"""
+        return self._num_blocks * self.block_size - length_hint(self._block_cards)
+
 
 def score(cards):
     """Calculate the score of a BLackjack hand"""
@@ -46,15 +91,144 @@ def stand(stand_on_value, stand_on_soft, cards):
     return True
 
 
+def bust_rate(num_runs, stand_value, stand_on_soft, source=None):
+    """Return the fraction of num_runs hands that bust, drawing from source"""
+    draw = source.get_card if source else get_card
+    num_busts = 0
+    for _ in range(num_runs):
+        hand = [draw(), draw()]
+        while not stand(stand_value, stand_on_soft, hand):
+            hand.append(draw())
+        if score(hand)[0] > 21:
+            num_busts += 1
+    return num_busts / num_runs
+
+
+def play_hands(stand_on_value, stand_on_soft, num_hands, rng):
+    """Play num_hands hands at once with NumPy, return their final totals
+
+    Each hand is a running hard total, counting aces as 1, and a flag for
+    holding an ace. Every round one card is drawn for each hand that has
+    not stood yet, until all hands stand.
+    """
+    hard = np.zeros(num_hands, dtype=np.int64)
+    has_ace = np.zeros(num_hands, dtype=bool)
+    active = np.arange(num_hands)
+    dealt = 0
+
+    while len(active):
+        cards = np.minimum(rng.integers(1, 14, size=len(active)), 10)
+        hard[active] += cards
+        has_ace[active] |= cards == 1
+        dealt += 1
+
+        # All hands start with two cards
+        if dealt < 2:
+            continue
+
+        # An ace counts as 11 if that does not bust the hand
+        soft = has_ace[active] & (hard[active] <= 11)
+        total = hard[active] + 10 * soft
+        hit = (total < stand_on_value) | ((total == stand_on_value) & soft & (not stand_on_soft))
+        active = active[hit]
+
+    return hard + 10 * (has_ace & (hard <= 11))
+
+
+def bust_rate_batch(num_runs, stand_value, stand_on_soft, rng=None):
+    """Return the fraction of num_runs hands that bust, played in batches"""
+    if rng is None:
+        rng = np.random.default_rng()
+    num_busts = 0
+    for start in range(0, num_runs, BATCH_SIZE):
+        totals = play_hands(stand_value, stand_on_soft, min(BATCH_SIZE, num_runs - start), rng)
+        num_busts += int((totals > 21).sum())
+    return num_busts / num_runs
+
+
+def run_profiled(function, args, profile=None, stats=None, hands=None, cells=1, cards=None):
+    """Return function(*args), timed for stats and run under cProfile for profile
+
+    The profile is written to the file profile, for pstats or snakeviz, and
+    the throughput to the file stats as JSON. hands and cards are the number
+    of hands played and cards dealt, or functions of the result returning
+    them. With stats alone the run is timed as it is, as cProfile slows it
+    down several times.
+    """
+    if not (profile or stats):
+        return function(*args)
+
+    profiler = cProfile.Profile() if profile else None
+    start = time.perf_counter()
+    result = profiler.runcall(function, *args) if profiler else function(*args)
+    seconds = time.perf_counter() - start
+
+    if profile:
+        profiler.dump_stats(profile)
+    if stats:
+        num_hands = hands(result) if callable(hands) else hands
+        num_cards = cards(result) if callable(cards) else cards
+        with open(stats, 'w') as f:
+            json.dump(throughput(seconds, num_hands, num_cards, cells, profiler), f, indent=2)
+    return result
+
+
+def throughput(seconds, hands, cards=None, cells=1, profiler=None):
+    """Return hands per second, time per cell, cards per hand and where the time went
+
+    cards_per_hand is left out if the cards dealt are not known. With a
+    profiler, the split gives the time spent in the functions of each group
+    of STATS_FUNCTIONS themselves, and the times are marked as profiled, as
+    they are slower than a plain run.
+    """
+    result = {
+        'seconds': seconds,
+        'hands': hands,
+        'hands_per_second': hands / seconds if seconds else None,
+        'cells': cells,
+        'seconds_per_cell': seconds / cells,
+        'profiled': profiler is not None,
+    }
+    if cards is not None and hands:
+        result['cards_per_hand'] = cards / hands
+    if profiler:
+        own_time = defaultdict(float)
+        for (_, _, name), (_, _, tottime, _, _) in pstats.Stats(profiler).stats.items():
+            own_time[name] += tottime
+        result['time_split'] = {group: sum(own_time[name] for name in names)
+                                for group, names in STATS_FUNCTIONS.items()}
+    return result
+
+
 def parse_inputs(args):
     usage_msg = """
-    USAGE: blackjack.py <num-simulations> <stand-on-value> <strategy>
+    USAGE: blackjack.py <num-simulations> <stand-on-value> <strategy> [engine]
+                        [--seed <n>] [--profile <fname>] [--stats <fname>]
 
     num-simulations - number of simulations to run, INT greater than 0
     stand-on-value - score on which to stand, INT between 1 and 20
     strategy - must be 'soft' or 'hard'
+    engine - 'hand' to play one hand at a time (default), or 'batch' to
+             play many hands at once with NumPy
+    --seed - seed of the random cards, INT 0 or more, for repeatable runs
+    --profile - write cProfile output of the run to <fname>
+    --stats - write hands per second and cards per hand to <fname> as JSON,
+              and with --profile the time spent in score, stand and get_card
     """
-    if (len(args) != 4):
+    # Options come in pairs and may be anywhere among the arguments
+    options = {'--seed': None, '--profile': None, '--stats': None}
+    args = list(args)
+    for option in options:
+        if option in args:
+            i = args.index(option)
+            if i + 1 == len(args):
+                print(f"No value given for {option}")
+                print(usage_msg)
+                sys.exit(1)
+            options[option] = args.pop(i + 1)
+            args.pop(i)
+
+    if (len(args) not in (4, 5)):
         print("Incorrect number of arguments provided")
         print(usage_msg)
         sys.exit(1)
@@ -66,27 +240,32 @@ def parse_inputs(args):
             raise ValueError
         if not (strategy == 'soft' or strategy == 'hard'):
             raise ValueError
+        engine = args[4] if len(args) == 5 else 'hand'
+        if not (engine == 'hand' or engine == 'batch'):
+            raise ValueError
+        seed = int(options['--seed']) if options['--seed'] is not None else None
+        if seed is not None and seed < 0:
+            raise ValueError
     except ValueError:
         print("Invalid argument provided")
         print(usage_msg)
         sys.exit(2)
 
     stand_on_soft = True if strategy == 'soft' else False
-    return (num_runs, stand_value, stand_on_soft)
+    return (num_runs, stand_value, stand_on_soft, engine, seed, options['--profile'], options['--stats'])
 
 
 def main():
-    num_runs, stand_value, stand_on_soft = parse_inputs(sys.argv)
+    num_runs, stand_value, stand_on_soft, engine, seed, profile, stats = parse_inputs(sys.argv)
 
-    num_busts = 0
-    for _ in range(num_runs):
-        hand = [get_card(), get_card()]
-        while not stand(stand_value, stand_on_soft, hand):
-            hand.append(get_card())
-        if score(hand)[0] > 21:
-            num_busts += 1
-    bust_percentage = num_busts / num_runs
-    print(bust_percentage)
+    if engine == 'batch':
+        print(run_profiled(bust_rate_batch, (num_runs, stand_value, stand_on_soft, np.random.default_rng(seed)),
+                           profile, stats, num_runs))
+        return
+
+    source = CardSource(seed)
+    print(run_profiled(bust_rate, (num_runs, stand_value, stand_on_soft, source),
+                       profile, stats, num_runs, cards=lambda rate: source.cards))
 
 
 if __name__ == '__main__':
@@ -1,7 +1,16 @@
 #!/usr/bin/env python3
 
+import os
+import json
+import math
+import pstats
+import tempfile
 import unittest
-from blackjack import score, stand
+from contextlib import redirect_stdout
+
+import numpy as np
+
+from blackjack import run_profiled, parse_inputs, CardSource, score, stand, bust_rate, play_hands, bust_rate_batch
 
 class TestBlackjack(unittest.TestCase):
 
@@ -34,5 +43,75 @@ class TestBlackjack(unittest.TestCase):
         self.assertFalse(stand(17, True, [11,4]))
         self.assertFalse(stand(17, True, [1,1]))
 
+    def test_bust_rate(self):
+        # The same seed gives the same cards and bust rate
+        self.assertEqual(bust_rate(2000, 17, True, CardSource(1)), bust_rate(2000, 17, True, CardSource(1)))
+        self.assertEqual(bust_rate(2000, 12, False, CardSource(2)), 0)
+
+    def test_run_profiled(self):
+        # The profile and stats files describe the run
+        with tempfile.TemporaryDirectory() as tmp:
+            profile, stats = (os.path.join(tmp, 'run.prof'), os.path.join(tmp, 'run.json'))
+            source = CardSource(1)
+            rate = run_profiled(bust_rate, (2000, 17, True, source), profile, stats, 2000,
+                                cards=lambda rate: source.cards)
+            self.assertEqual(rate, bust_rate(2000, 17, True, CardSource(1)))
+            self.assertGreater(pstats.Stats(profile).total_calls, 0)
+            with open(stats) as f:
+                result = json.load(f)
+        self.assertEqual(result['hands'], 2000)
+        self.assertTrue(2 < result['cards_per_hand'] < 4)
+        self.assertTrue(result['profiled'])
+        self.assertEqual(set(result['time_split']), {'score', 'stand', 'get_card'})
+
+        # Without a profile the run is timed as it is, with no split
+        with tempfile.TemporaryDirectory() as tmp:
+            stats = os.path.join(tmp, 'run.json')
+            run_profiled(bust_rate_batch, (2000, 17, True), stats=stats, hands=2000)
+            with open(stats) as f:
+                result = json.load(f)
+        self.assertFalse(result['profiled'])
+        self.assertNotIn('time_split', result)
+        self.assertNotIn('cards_per_hand', result)
+
+    def test_parse_seed(self):
+        # --seed is optional and may come anywhere, like the file options
+        self.assertEqual(parse_inputs(['blackjack.py', '100', '17', 'soft'])[4], None)
+        self.assertEqual(parse_inputs(['blackjack.py', '--seed', '7', '100', '17', 'soft', 'batch'])[3:5], ('batch', 7))
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            for seed in ('x', '-1'):
+                with self.subTest(seed=seed), self.assertRaises(SystemExit):
+                    parse_inputs(['blackjack.py', '100', '17', 'soft', '--seed', seed])
+
+    def test_card_count(self):
+        # Cards are counted across blocks without drawing any extra
+        source = CardSource(1, block_size=10)
+        for _ in range(25):
+            source.get_card()
+        self.assertEqual(source.cards, 25)
+
+    def test_play_hands(self):
+        # Hands stand at 17 or more, soft 17 only when standing on soft
+        rng = np.random.default_rng(1)
+        totals = play_hands(17, True, 10000, rng)
+        self.assertTrue((totals >= 17).all())
+        self.assertTrue((totals <= 26).all())
+
+    def test_bust_rate_batch(self):
+        # A hand below 12 can not bust, so standing on 12 never busts
+        rng = np.random.default_rng(2)
+        self.assertEqual(bust_rate_batch(20000, 12, True, rng), 0)
+        self.assertTrue(0 < bust_rate_batch(20000, 20, True, rng) < 1)
+
+    def test_batch_matches_hand(self):
+        # Both engines bust as often as the exact chance of standing on 17,
+        # from Week4's exact_distribution, to within 4 standard errors
+        for stand_on_soft, exact in ((True, 0.2815928), (False, 0.2854189)):
+            batch = bust_rate_batch(200000, 17, stand_on_soft, np.random.default_rng(3))
+            hand = bust_rate(20000, 17, stand_on_soft, CardSource(3))
+            for rate, num_runs in ((batch, 200000), (hand, 20000)):
+                with self.subTest(stand_on_soft=stand_on_soft, num_runs=num_runs):
+                    self.assertAlmostEqual(rate, exact, delta=4 * math.sqrt(exact * (1 - exact) / num_runs))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
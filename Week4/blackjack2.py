@@ -1,17 +1,266 @@
 #!/usr/bin/env python3
 
 import sys
+import json
+import time
 import random
 import csv
+import math
+import argparse
+import pstats
+import cProfile
 from collections import namedtuple, defaultdict
 
+from operator import length_hint
+
+import numpy as np
+
 Score = namedtuple('Score', 'total soft_ace_count')
 Stand = namedtuple('Stand', 'stand total')
 
+# Hands played at once by the batch engine
+BATCH_SIZE = 1 << 20
+
+# Cards in the stream of each hand of a CommonCardSource, enough for 21 aces
+# and one more card
+HAND_CARDS = 22
+
+# Chance of drawing each card value 1 to 10 from an infinite deck, where
+# 10 also stands for the face cards
+CARD_PROBS = [1 / 13] * 9 + [4 / 13]
+
+# Hands played between checks of the confidence interval, and the normal
+# quantile of a 95% interval
+CI_BATCH = 1000
+Z_95 = 1.96
+
+# Functions whose own time --stats adds up for each part of playing a hand,
+# when the run is also profiled with --profile. '<listcomp>' is the
+# comprehension in score(), which only has its own entry before Python 3.12,
+# when comprehensions became part of their function.
+STATS_FUNCTIONS = {'score': ('score', '<listcomp>'), 'stand': ('stand',),
+                   'get_card': ('get_card', '_cards', '_uniforms')}
+
 def get_card():
     """Return a card value between 1 and 13"""
     return random.randint(1, 13)
 
+class CardSource:
+    """Cards between 1 and 13 drawn from blocks of pre-generated random numbers
+
+    Drawing a card is a single call to the next() of an iterator over the
+    current block, much cheaper than random.randint. The same seed always
+    gives the same cards. The cards dealt are counted by block, so counting
+    them costs nothing per card.
+    """
+
+    def __init__(self, seed=None, block_size=1 << 16):
+        self.rng = np.random.default_rng(seed)
+        self.block_size = block_size
+        self._num_blocks = 0
+        self._block_cards = iter(())
+        self.get_card = self._cards().__next__
+
+    # Plain sources deal every card from the same stream
+    common = False
+
+    def _cards(self):
+        while True:
+            self._block_cards = iter(self.rng.integers(1, 14, size=self.block_size).tolist())
+            self._num_blocks += 1
+            yield from self._block_cards
+
+    @property
+    def cards(self):
+        """Number of cards dealt so far"""
+        return self._num_blocks * self.block_size - length_hint(self._block_cards)
+
+    def next_hand(self):
+        """Start the cards of a new hand, which only common sources act on"""
+
+
+class CommonCardSource(CardSource):
+    """Cards dealt from a fixed stream of HAND_CARDS cards for every hand
+
+    Hand i always gets row i of the stream, however many cards the earlier
+    hands used, so strategies playing from sources with the same seed see
+    the same cards (common random numbers) and their differences are less
+    noisy. With antithetic, every group of group_size rows is followed by
+    its mirror image, each card c replaced by 14 - c. The group is the hands
+    of one game, so that the hands within a game stay independent.
+    """
+
+    common = True
+
+    def __init__(self, seed=None, antithetic=False, group_size=1, block_size=1 << 12):
+        super().__init__(seed, block_size)
+        self.antithetic = antithetic
+        self.group_size = group_size
+        self._block = np.empty((0, HAND_CARDS), dtype=np.int64)
+        self._rows = []
+        self._pos = 0
+        self._row = iter(())
+        self._dealt = 0
+
+        # A card drawn before any next_hand() starts the first hand
+        self.get_card = self._first_card
+
+    def _first_card(self):
+        self.next_hand()
+        return self.get_card()
+
+    def _next_block(self):
+        if self.antithetic:
+            groups = self.rng.integers(1, 14, size=(self.block_size, self.group_size, HAND_CARDS))
+            self._block = np.stack([groups, 14 - groups], axis=1).reshape(-1, HAND_CARDS)
+        else:
+            self._block = self.rng.integers(1, 14, size=(self.block_size, HAND_CARDS))
+        self._rows = None
+        self._pos = 0
+
+    def next_hand(self):
+        """Deal the cards of the next hand from get_card"""
+        if self._pos == len(self._block):
+            self._next_block()
+        if self._rows is None:
+            self._rows = self._block.tolist()
+
+        # The cards left in the last row were never dealt
+        self._dealt += HAND_CARDS - length_hint(self._row)
+        self._row = iter(self._rows[self._pos])
+        self.get_card = self._row.__next__
+        self._pos += 1
+
+    @property
+    def cards(self):
+        """Number of cards dealt so far from the rows of next_hand()"""
+        return self._dealt - length_hint(self._row)
+
+    def rows(self, num_hands):
+        """Return the card streams of the next num_hands hands as an array"""
+        parts = []
+        while num_hands:
+            if self._pos == len(self._block):
+                self._next_block()
+            take = min(num_hands, len(self._block) - self._pos)
+            parts.append(self._block[self._pos:self._pos + take])
+            self._pos += take
+            num_hands -= take
+        return np.concatenate(parts) if parts else self._block[:0]
+
+
+class Shoe:
+    """A shoe of num_decks decks, dealt without replacement
+
+    The cards left are a count of each of the 13 ranks. A card is drawn by
+    picking a position among the cards left and walking the counts to its
+    rank, so nothing is ever shuffled. Once penetration of the shoe has been
+    dealt it is refilled, before the first hand of the next group of
+    group_size hands, e.g. the two hands of a game.
+    """
+
+    common = False
+
+    def __init__(self, num_decks=6, penetration=0.75, seed=None, group_size=1, block_size=1 << 16):
+        self.rng = np.random.default_rng(seed)
+        self.num_decks = num_decks
+        self.size = 52 * num_decks
+        self.cut = int(penetration * self.size)
+        self.group_size = group_size
+        self.block_size = block_size
+        self._hands = 0
+        self._uniform = self._uniforms().__next__
+
+        # Cards dealt from earlier fillings of the shoe
+        self._dealt = 0
+        self.remaining = self.size
+        self.reshuffle()
+
+    def _uniforms(self):
+        while True:
+            yield from self.rng.random(self.block_size).tolist()
+
+    def reshuffle(self):
+        """Put all the cards back in the shoe"""
+        self._dealt += self.size - self.remaining
+        self.counts = [4 * self.num_decks] * 13
+        self.remaining = self.size
+
+    def next_hand(self):
+        """Start a new hand, refilling the shoe if it is time to"""
+        if self._hands % self.group_size == 0 and self.size - self.remaining >= self.cut:
+            self.reshuffle()
+        self._hands += 1
+
+    def get_card(self):
+        """Return a card value between 1 and 13 drawn from the shoe"""
+        if not self.remaining:
+            self.reshuffle()
+        position = int(self._uniform() * self.remaining)
+        counts = self.counts
+        card = 0
+        while position >= counts[card]:
+            position -= counts[card]
+            card += 1
+        counts[card] -= 1
+        self.remaining -= 1
+        return card + 1
+
+    @property
+    def cards(self):
+        """Number of cards dealt so far"""
+        return self._dealt + self.size - self.remaining
+
+
+class ShoeArray:
+    """num_shoes independent Shoes dealt at once with NumPy
+
+    The cards left are a (num_shoes, 13) array of counts, and each draw
+    deals one card from each of the given shoes by the same weighted
+    selection as Shoe. The batch engine plays one hand per shoe at a time.
+    """
+
+    common = False
+
+    def __init__(self, num_shoes=10000, num_decks=6, penetration=0.75, seed=None):
+        self.rng = np.random.default_rng(seed)
+        self.num_shoes = num_shoes
+        self.num_decks = num_decks
+        self.size = 52 * num_decks
+        self.cut = int(penetration * self.size)
+        self.counts = np.full((num_shoes, 13), 4 * num_decks, dtype=np.int64)
+        self.remaining = np.full(num_shoes, self.size, dtype=np.int64)
+
+    def reshuffle(self, shoes):
+        """Put all the cards back in the given shoes"""
+        self.counts[shoes] = 4 * self.num_decks
+        self.remaining[shoes] = self.size
+
+    def next_hand(self):
+        """Start a new hand in every shoe, refilling those past the cut"""
+        self.reshuffle(self.size - self.remaining >= self.cut)
+
+    def draw(self, shoes):
+        """Return one card value between 1 and 13 drawn from each of the given shoes"""
+        self.reshuffle(shoes[self.remaining[shoes] == 0])
+        positions = (self.rng.random(len(shoes)) * self.remaining[shoes]).astype(np.int64)
+        ranks = (self.counts[shoes].cumsum(axis=1) <= positions[:, None]).sum(axis=1)
+        self.counts[shoes, ranks] -= 1
+        self.remaining[shoes] -= 1
+        return ranks + 1
+
+
+def make_source(seed=None, cards='random', group_size=1, decks=0, penetration=0.75, batch=False):
+    """Return a CardSource, or a CommonCardSource for cards 'common' or 'antithetic',
+    or a Shoe of decks decks if decks is not 0, many of them in a ShoeArray for batch"""
+    if decks and batch:
+        return ShoeArray(num_decks=decks, penetration=penetration, seed=seed)
+    if decks:
+        return Shoe(decks, penetration, seed, group_size)
+    if cards == 'random':
+        return CardSource(seed)
+    return CommonCardSource(seed, antithetic=cards == 'antithetic', group_size=group_size)
+
 
 def score(cards):
     """Calculate the score of a Blackjack hand"""
@@ -50,43 +299,68 @@ def stand(stand_on_value, stand_on_soft, cards):
     return Stand(True, s.total)
 
 
-def play_hand(stand_on_value, stand_on_soft):
-    """Play a Blackjack hand, return the total"""
-    
+def play_hand(stand_on_value, stand_on_soft, source=None):
+    """Play a Blackjack hand, return the total
+
+    Cards are drawn from source, a CardSource, or get_card if there is none"""
+    if source:
+        source.next_hand()
+    draw = source.get_card if source else get_card
+
     # All hands start with two cards
-    hand = [get_card(), get_card()]
+    hand = [draw(), draw()]
 
     # Continue to deal cards until stand condition is reached
     while True: 
         stand_returns = stand(stand_on_value, stand_on_soft, hand)
         if stand_returns.stand:
             return stand_returns.total if stand_returns.total < 22 else 22
-        hand.append(get_card())
+        hand.append(draw())
+
+
+def half_width(count, runs):
+    """Return the half-width of the 95% confidence interval of a percentage"""
+    p = count / runs
+    return Z_95 * math.sqrt(p * (1 - p) / runs) * 100
 
 
-def simulate_strategy(stand_value, stand_on_soft, iterations):
+def simulate_strategy(stand_value, stand_on_soft, iterations, source=None, ci=None):
     """
     Run simulation of Blackjack strategy, keeping tally of scores then 
     calculate the percentage that each score was earned
+
+    With ci, hands are played in batches until the 95% confidence interval
+    of the bust percentage is narrower than +/- ci, or iterations are used
+    up, and the half-width and hands played are added as CI and RUNS.
     
     return: dict of scores and their percentage earned, last entry is # of busts
     """
     score_dict = defaultdict(int)
 
     # Keep a tally of the final score every iteration
-    for _ in range(iterations):
-        score = play_hand(stand_value, stand_on_soft)
-        if score < 22:
-            score_dict[str(score)] += 1
-        else:
-            score_dict['BUST'] += 1
+    runs = 0
+    while runs < iterations:
+        batch = min(CI_BATCH if ci else iterations, iterations - runs)
+        for _ in range(batch):
+            score = play_hand(stand_value, stand_on_soft, source)
+            if score < 22:
+                score_dict[str(score)] += 1
+            else:
+                score_dict['BUST'] += 1
+        runs += batch
+        if ci and half_width(score_dict['BUST'], runs) < ci:
+            break
 
     # Convert the counts to percentages
     for score in score_dict.keys():
         if score != 'BUST':
-            score_dict[score] = score_dict[score] / iterations * 100
+            score_dict[score] = score_dict[score] / runs * 100
             score_dict[score] = str("{:.2f}").format(score_dict[score])
 
+    if ci:
+        score_dict['CI'] = "{:.3f}".format(half_width(score_dict['BUST'], runs))
+        score_dict['RUNS'] = runs
+
     # Add strategy at the end to make the above logic easier
     score_dict['STRATEGY'] = 'S' if stand_on_soft else 'H' 
     score_dict['STRATEGY'] += str(stand_value)
@@ -94,18 +368,285 @@ def simulate_strategy(stand_value, stand_on_soft, iterations):
     return score_dict
 
 
+def play_hands(stand_on_value, stand_on_soft, num_hands, rng, cards=None, shoes=None):
+    """Play num_hands Blackjack hands at once, return their totals (22 if bust)
+
+    Week3's play_hands, dealing from cards instead of rng if it is given,
+    an array of a row of cards per hand, and from shoes if it is given, a
+    ShoeArray dealing hand i from shoe i.
+    """
+    hard = np.zeros(num_hands, dtype=np.int64)
+    has_ace = np.zeros(num_hands, dtype=bool)
+    active = np.arange(num_hands)
+    dealt = 0
+
+    while len(active):
+        if shoes is not None:
+            drawn = np.minimum(shoes.draw(active), 10)
+        elif cards is None:
+            drawn = np.minimum(rng.integers(1, 14, size=len(active)), 10)
+        else:
+            drawn = np.minimum(cards[active, dealt], 10)
+        hard[active] += drawn
+        has_ace[active] |= drawn == 1
+        dealt += 1
+
+        # All hands start with two cards
+        if dealt < 2:
+            continue
+
+        # An ace counts as 11 if that does not bust the hand
+        soft = has_ace[active] & (hard[active] <= 11)
+        total = hard[active] + 10 * soft
+        hit = (total < stand_on_value) | ((total == stand_on_value) & soft & (not stand_on_soft))
+        active = active[hit]
+
+    total = hard + 10 * (has_ace & (hard <= 11))
+    return np.minimum(total, 22)
+
+
+def simulate_strategy_batch(stand_value, stand_on_soft, iterations, source=None, ci=None):
+    """
+    Same as simulate_strategy, but playing hands in batches of NumPy arrays
+    drawn from the generator of source, from its rows if it is common, or
+    a hand from each of its shoes at a time if it is a ShoeArray
+
+    return: dict of scores and their percentage earned, last entry is # of busts
+    """
+    rng = source.rng if source else np.random.default_rng()
+    shoes = source if isinstance(source, ShoeArray) else None
+    step = shoes.num_shoes if shoes else CI_BATCH if ci else BATCH_SIZE
+
+    counts = np.zeros(23, dtype=np.int64)
+    runs = 0
+    while runs < iterations:
+        batch = min(step, iterations - runs)
+        cards = source.rows(batch) if source and source.common else None
+        if shoes:
+            shoes.next_hand()
+        totals = play_hands(stand_value, stand_on_soft, batch, rng, cards, shoes)
+        counts += np.bincount(totals, minlength=23)
+        runs += batch
+        if ci and half_width(counts[22], runs) < ci:
+            break
+
+    score_dict = {}
+    for score in np.flatnonzero(counts[:22]):
+        score_dict[str(score)] = "{:.2f}".format(counts[score] / runs * 100)
+    if counts[22]:
+        score_dict['BUST'] = int(counts[22])
+
+    if ci:
+        score_dict['CI'] = "{:.3f}".format(half_width(counts[22], runs))
+        score_dict['RUNS'] = runs
+
+    score_dict['STRATEGY'] = 'S' if stand_on_soft else 'H'
+    score_dict['STRATEGY'] += str(stand_value)
+    return score_dict
+
+
+def exact_distribution(stand_on_value, stand_on_soft):
+    """Return the exact chance of each final total with an infinite deck
+
+    return: list of 23 probabilities indexed by total, where 22 is a bust
+
+    A hand is a state (hard total counting aces as 1, holding an ace). Every
+    card raises the hard total, so the chance of reaching each state can be
+    worked out in increasing order of hard total, passing it on to the next
+    states while hitting and adding it to the final total once standing.
+    """
+    # Hard totals stay below 32, as the largest hit is on a hard 21
+    reach = [[0.0, 0.0] for _ in range(32)]
+    final = [0.0] * 23
+
+    # All hands start with two cards
+    for first in range(1, 11):
+        for second in range(1, 11):
+            reach[first + second][first == 1 or second == 1] += CARD_PROBS[first - 1] * CARD_PROBS[second - 1]
+
+    for hard in range(2, 32):
+        for has_ace in (0, 1):
+            chance = reach[hard][has_ace]
+            if not chance:
+                continue
+
+            # An ace counts as 11 if that does not bust the hand
+            soft = has_ace and hard <= 11
+            total = hard + 10 if soft else hard
+            if total > stand_on_value or (total == stand_on_value and (stand_on_soft or not soft)):
+                final[min(total, 22)] += chance
+                continue
+
+            for card in range(1, 11):
+                reach[hard + card][has_ace or card == 1] += chance * CARD_PROBS[card - 1]
+
+    return final
+
+
+def simulate_strategy_exact(stand_value, stand_on_soft, iterations, source=None, ci=None):
+    """
+    Same as simulate_strategy, but with exact percentages instead of sampled
+    ones. BUST is the expected number of busts in iterations hands, and
+    source and ci are not used.
+
+    return: dict of scores and their percentage earned, last entry is # of busts
+    """
+    final = exact_distribution(stand_value, stand_on_soft)
+
+    score_dict = {}
+    for score in range(22):
+        if final[score]:
+            score_dict[str(score)] = "{:.2f}".format(final[score] * 100)
+    score_dict['BUST'] = "{:.2f}".format(final[22] * iterations)
+
+    score_dict['STRATEGY'] = 'S' if stand_on_soft else 'H'
+    score_dict['STRATEGY'] += str(stand_value)
+    return score_dict
+
+
+def run_profiled(function, args, profile=None, stats=None, hands=None, cells=1, cards=None):
+    """Return function(*args), timed for stats and run under cProfile for profile
+
+    The profile is written to the file profile, for pstats or snakeviz, and
+    the throughput to the file stats as JSON. hands and cards are the number
+    of hands played and cards dealt, or functions of the result returning
+    them. With stats alone the run is timed as it is, as cProfile slows it
+    down several times.
+    """
+    if not (profile or stats):
+        return function(*args)
+
+    profiler = cProfile.Profile() if profile else None
+    start = time.perf_counter()
+    result = profiler.runcall(function, *args) if profiler else function(*args)
+    seconds = time.perf_counter() - start
+
+    if profile:
+        profiler.dump_stats(profile)
+    if stats:
+        num_hands = hands(result) if callable(hands) else hands
+        num_cards = cards(result) if callable(cards) else cards
+        with open(stats, 'w') as f:
+            json.dump(throughput(seconds, num_hands, num_cards, cells, profiler), f, indent=2)
+    return result
+
+
+def throughput(seconds, hands, cards=None, cells=1, profiler=None):
+    """Return hands per second, time per cell, cards per hand and where the time went
+
+    cards_per_hand is left out if the cards dealt are not known. With a
+    profiler, the split gives the time spent in the functions of each group
+    of STATS_FUNCTIONS themselves, and the times are marked as profiled, as
+    they are slower than a plain run.
+    """
+    result = {
+        'seconds': seconds,
+        'hands': hands,
+        'hands_per_second': hands / seconds if seconds else None,
+        'cells': cells,
+        'seconds_per_cell': seconds / cells,
+        'profiled': profiler is not None,
+    }
+    if cards is not None and hands:
+        result['cards_per_hand'] = cards / hands
+    if profiler:
+        own_time = defaultdict(float)
+        for (_, _, name), (_, _, tottime, _, _) in pstats.Stats(profiler).stats.items():
+            own_time[name] += tottime
+        result['time_split'] = {group: sum(own_time[name] for name in names)
+                                for group, names in STATS_FUNCTIONS.items()}
+    return result
+
+
+def simulate_table(simulate, num_runs, args):
+    """Return a row of results for every strategy, from the command line args,
+    and the number of cards dealt, or None if the engine does not deal them
+    one at a time from its source"""
+    rows = []
+
+    # Common cards start every strategy from the same seed
+    sources = [make_source(args.seed, decks=args.decks, penetration=args.penetration,
+                           batch=args.engine == 'batch')]
+    seed = args.seed if args.seed is not None else np.random.SeedSequence().entropy
+    for stand_val in range(13, 21):
+        for stand_on_soft in (False, True):
+            if args.cards != 'random':
+                sources.append(make_source(seed, args.cards))
+            rows.append(simulate(stand_val, stand_on_soft, num_runs, sources[-1], args.ci))
+    cards = sum(source.cards for source in sources) if args.engine == 'hand' else None
+    return (rows, cards)
+
+
 def main():
-    if (len(sys.argv) != 2):
-        print("Please provide 1 argument: number of simulations to run")
-        sys.exit(1)
-    num_runs = int(sys.argv[1])
+    parser = argparse.ArgumentParser(
+        description='Simulate Blackjack stand strategies and tabulate the final scores.')
+
+    parser.add_argument('num_runs', type=int, metavar='<num-simulations>',
+                        help='number of hands to play per strategy, the most '
+                             'to play with --ci')
+
+    parser.add_argument('--engine', choices=['hand', 'batch', 'exact'], default='hand',
+                        help='hand plays one hand at a time, batch plays '
+                             'many hands at once with NumPy, exact computes '
+                             'the percentages without sampling (default: %(default)s)')
+
+    parser.add_argument('--seed', type=int,
+                        help='seed of the random cards, for repeatable runs')
+
+    parser.add_argument('--ci', type=float, metavar='<percent>',
+                        help='play each strategy until the 95%% confidence '
+                             'interval of its bust percentage is within '
+                             '+/- this, and add the CI and hands played')
+
+    parser.add_argument('--cards', choices=['random', 'common', 'antithetic'], default='random',
+                        help='random deals every strategy its own cards, common '
+                             'deals every strategy the same cards for each hand, '
+                             'antithetic also mirrors half of those cards, so '
+                             'differences between strategies are less noisy '
+                             '(default: %(default)s)')
+
+    parser.add_argument('--decks', type=int, default=0, metavar='<n>',
+                        help='deal from a shoe of this many decks instead of an '
+                             'infinite deck, one shoe for the hand engine and '
+                             'many in parallel for the batch engine (default: infinite)')
+
+    parser.add_argument('--penetration', type=float, default=0.75,
+                        help='fraction of a shoe dealt before it is refilled '
+                             '(default: %(default)s)')
+
+    parser.add_argument('--profile', metavar='<fname>',
+                        help='write cProfile output of the run to this file')
+
+    parser.add_argument('--stats', metavar='<fname>',
+                        help='write hands per second, time per strategy and cards '
+                             'per hand to this file as JSON, and with --profile '
+                             'the time spent in score, stand and get_card')
+
+    args = parser.parse_args()
+    if args.num_runs < 1:
+        parser.error("number of simulations must be at least 1")
+    if args.ci is not None and (args.ci <= 0 or args.engine == 'exact'):
+        parser.error("--ci must be positive and needs a sampling engine")
+    if args.decks < 0 or not 0 < args.penetration <= 1:
+        parser.error("decks must not be negative and penetration must be between 0 and 1")
+    if args.decks and (args.engine == 'exact' or args.cards != 'random'):
+        parser.error("--decks needs a sampling engine and random cards")
+    num_runs = args.num_runs
+    simulate = {'hand': simulate_strategy, 'batch': simulate_strategy_batch,
+                'exact': simulate_strategy_exact}[args.engine]
 
     fieldnames = ['STRATEGY','13','14','15','16','17','18','19','20','21','BUST']
+    if args.ci:
+        fieldnames += ['CI', 'RUNS']
+
+    # Hands played, which --ci can make fewer than num_runs per strategy
+    hands = 0 if args.engine == 'exact' else lambda table: sum(row.get('RUNS', num_runs) for row in table[0])
+    rows, _ = run_profiled(simulate_table, (simulate, num_runs, args), args.profile, args.stats,
+                           hands, cells=16, cards=lambda table: table[1])
+
     writer = csv.DictWriter(sys.stdout, fieldnames, restval="{:.2f}".format(0.0))
     writer.writeheader()
-    for stand_val in range(13, 21):
-        writer.writerow(simulate_strategy(stand_val, False, num_runs))
-        writer.writerow(simulate_strategy(stand_val, True, num_runs))
+    writer.writerows(rows)
 
 
 if __name__ == '__main__':
@@ -1,7 +1,13 @@
 #!/usr/bin/env python3
 
+import random
+import cProfile
 import unittest
-from blackjack2 import score, stand
+
+import numpy as np
+
+from blackjack2 import (throughput, CardSource, make_source, Shoe, ShoeArray, score, stand, half_width, play_hands, simulate_strategy, simulate_strategy_batch,
+                        exact_distribution, simulate_strategy_exact)
 
 class TestBlackjack(unittest.TestCase):
 
@@ -51,5 +57,137 @@ class TestBlackjack(unittest.TestCase):
         self.assertFalse(ret.stand)
         self.assertEqual(ret.total, 12)
 
+    # The same seed gives the same cards and the same results
+    def test_card_source(self):
+        a, b = CardSource(5, block_size=100), CardSource(5, block_size=100)
+        cards = [a.get_card() for _ in range(1000)]
+        self.assertEqual(cards, [b.get_card() for _ in range(1000)])
+        self.assertEqual(set(cards), set(range(1, 14)))
+        self.assertEqual(simulate_strategy(17, True, 2000, CardSource(6)),
+                         simulate_strategy(17, True, 2000, CardSource(6)))
+
+    # Hands stop once the bust percentage is known well enough
+    def test_simulate_strategy_ci(self):
+        for simulate in (simulate_strategy, simulate_strategy_batch):
+            with self.subTest(simulate=simulate.__name__):
+                result = simulate(17, True, 10**6, CardSource(7), ci=1)
+                self.assertLess(result['RUNS'], 10**6)
+                self.assertLess(half_width(result['BUST'], result['RUNS']), 1)
+                self.assertEqual(result['CI'], "{:.3f}".format(half_width(result['BUST'], result['RUNS'])))
+
+                # The number of iterations is still the most played
+                self.assertEqual(simulate(17, True, 1500, CardSource(7), ci=0.01)['RUNS'], 1500)
+
+    # Both engines play the same hands from common cards
+    def test_common_cards(self):
+        for cards in ('common', 'antithetic'):
+            with self.subTest(cards=cards):
+                self.assertEqual(simulate_strategy(16, False, 3000, make_source(8, cards)),
+                                 simulate_strategy_batch(16, False, 3000, make_source(8, cards)))
+
+        # Differences between strategies on common cards are less noisy
+        spreads = {}
+        for cards in ('random', 'common'):
+            diffs = [simulate_strategy_batch(17, False, 2000, make_source(seed, cards))['BUST']
+                     - simulate_strategy_batch(17, True, 2000, make_source(seed + (cards == 'random'), cards))['BUST']
+                     for seed in range(0, 40, 2)]
+            spreads[cards] = max(diffs) - min(diffs)
+        self.assertLess(spreads['common'] * 3, spreads['random'])
+
+    # A shoe deals every card of its decks once, one shoe or many at a time
+    def test_shoe(self):
+        shoe = Shoe(2, penetration=1, seed=1)
+        self.assertEqual(sorted(shoe.get_card() for _ in range(104)), sorted(list(range(1, 14)) * 8))
+
+        shoes = ShoeArray(num_shoes=3, num_decks=2, penetration=1, seed=1)
+        cards = np.array([shoes.draw(np.arange(3)) for _ in range(104)])
+        for column in cards.T:
+            self.assertEqual(sorted(column), sorted(list(range(1, 14)) * 8))
+
+        # Shoes past the cut are refilled before the next hand
+        shoes = ShoeArray(num_shoes=2, num_decks=1, penetration=0.5, seed=1)
+        for _ in range(26):
+            shoes.draw(np.array([0]))
+        shoes.next_hand()
+        self.assertEqual(list(shoes.remaining), [52, 52])
+
+        # --decks picks one shoe for the hand engine and many for the batch engine
+        self.assertIsInstance(make_source(1, decks=2), Shoe)
+        self.assertIsInstance(make_source(1, decks=2, batch=True), ShoeArray)
+
+    # Both engines deal from a big shoe much like an infinite deck
+    def test_shoe_engines(self):
+        exact = exact_distribution(17, True)[22] * 20000
+        hand = simulate_strategy(17, True, 20000, Shoe(8, seed=2))['BUST']
+        batch = simulate_strategy_batch(17, True, 20000, ShoeArray(1000, 8, seed=3))['BUST']
+        self.assertAlmostEqual(hand, exact, delta=400)
+        self.assertAlmostEqual(batch, exact, delta=400)
+
+    # Cards are counted by every source the hand engine deals from
+    def test_throughput(self):
+        for source in (CardSource(1), make_source(1, 'common'), make_source(1, 'antithetic'), Shoe(2, seed=1)):
+            with self.subTest(source=type(source).__name__):
+                simulate_strategy(17, True, 3000, source)
+                result = throughput(2.0, 3000, source.cards, cells=2)
+                self.assertEqual(result['hands_per_second'], 1500)
+                self.assertEqual(result['seconds_per_cell'], 1)
+                self.assertTrue(2 < result['cards_per_hand'] < 4)
+                self.assertNotIn('time_split', result)
+
+        # The split of the time needs a profile, and unknown cards are left out
+        profiler = cProfile.Profile()
+        profiler.runcall(simulate_strategy, 17, True, 3000, CardSource(1))
+        result = throughput(2.0, 3000, profiler=profiler)
+        self.assertTrue(result['profiled'])
+        self.assertGreater(result['time_split']['score'], 0)
+        self.assertNotIn('cards_per_hand', result)
+
+    # Batch totals stop where the stand rule says, or bust as 22
+    def test_play_hands(self):
+        rng = np.random.default_rng(1)
+        for stand_on_soft in (False, True):
+            totals = play_hands(17, stand_on_soft, 10000, rng)
+            self.assertTrue(((totals >= 17) & (totals <= 22)).all())
+
+    # The batch engine gives the same distribution as the hand engine
+    def test_simulate_strategy_batch(self):
+        random.seed(2)
+        iterations = 20000
+        for stand_value, stand_on_soft in ((15, False), (17, True), (18, False)):
+            with self.subTest(stand_value=stand_value, stand_on_soft=stand_on_soft):
+                hand = simulate_strategy(stand_value, stand_on_soft, iterations)
+                batch = simulate_strategy_batch(stand_value, stand_on_soft, iterations,
+                                                CardSource(3))
+                self.assertEqual(batch['STRATEGY'], hand['STRATEGY'])
+                self.assertAlmostEqual(batch['BUST'] / iterations, hand['BUST'] / iterations, delta=0.02)
+                for total in range(stand_value, 22):
+                    self.assertAlmostEqual(float(batch.get(str(total), 0)),
+                                           float(hand.get(str(total), 0)), delta=2)
+
+    # Exact totals sum to 1 and only start at the stand value
+    def test_exact_distribution(self):
+        for stand_value in range(13, 21):
+            for stand_on_soft in (False, True):
+                final = exact_distribution(stand_value, stand_on_soft)
+                self.assertAlmostEqual(sum(final), 1)
+                self.assertEqual(sum(final[:stand_value]), 0)
+
+        # Standing on 12 can never bust, and a blackjack is 2 * 4/13 * 1/13
+        self.assertEqual(exact_distribution(12, True)[22], 0)
+        self.assertGreater(exact_distribution(21, True)[21], 2 * 4 / 169)
+
+    # The Monte Carlo engine agrees with the exact percentages
+    def test_simulate_strategy_exact(self):
+        iterations = 200000
+        for stand_value, stand_on_soft in ((13, False), (17, True), (17, False), (20, True)):
+            with self.subTest(stand_value=stand_value, stand_on_soft=stand_on_soft):
+                exact = simulate_strategy_exact(stand_value, stand_on_soft, iterations)
+                batch = simulate_strategy_batch(stand_value, stand_on_soft, iterations,
+                                                CardSource(4))
+                self.assertEqual(exact['STRATEGY'], batch['STRATEGY'])
+                self.assertAlmostEqual(float(exact['BUST']), batch['BUST'], delta=iterations * 0.005)
+                for total in range(stand_value, 22):
+                    self.assertAlmostEqual(float(exact[str(total)]), float(batch[str(total)]), delta=0.5)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
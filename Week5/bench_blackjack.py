@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+
+# Times the Blackjack engines of weeks 3 to 5 on fixed seeds and numbers of
+# hands, and saves hands per second and the error against the exact
+# distribution of final totals as JSON, so that an engine can be picked for
+# an error budget and runs can be compared against an earlier baseline.
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import logging
+import importlib.util
+
+import numpy as np
+
+import blackjack3
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_script(week, name):
+    """Import the script name.py of another week's folder, leaving sys.path alone"""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(HERE, '..', week, name + '.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+blackjack = load_script('Week3', 'blackjack')
+blackjack2 = load_script('Week4', 'blackjack2')
+
+
+def week3_hand(hands, stand_value, stand_on_soft, seed):
+    return {22: blackjack.bust_rate(hands, stand_value, stand_on_soft, blackjack.CardSource(seed))}
+
+
+def week3_batch(hands, stand_value, stand_on_soft, seed):
+    return {22: blackjack.bust_rate_batch(hands, stand_value, stand_on_soft, np.random.default_rng(seed))}
+
+
+def week4_totals(result, hands):
+    """Return the final totals of a simulate_strategy result as fractions"""
+    totals = {int(score): float(percent) / 100 for score, percent in result.items()
+              if score.isdigit()}
+    totals[22] = float(result.get('BUST', 0)) / hands
+    return totals
+
+
+def week4_hand(hands, stand_value, stand_on_soft, seed):
+    result = blackjack2.simulate_strategy(stand_value, stand_on_soft, hands, blackjack2.CardSource(seed))
+    return week4_totals(result, hands)
+
+
+def week4_batch(hands, stand_value, stand_on_soft, seed):
+    result = blackjack2.simulate_strategy_batch(stand_value, stand_on_soft, hands,
+                                                blackjack2.CardSource(seed))
+    return week4_totals(result, hands)
+
+
+def week4_exact(hands, stand_value, stand_on_soft, seed):
+    return dict(enumerate(blackjack2.exact_distribution(stand_value, stand_on_soft)))
+
+
+def week5_totals(dist):
+    """Return the final totals of a Week5 outcome distribution, counting a Blackjack as 21"""
+    totals = {total: dist[total] for total in range(1, 22)}
+    totals[21] += dist[blackjack3.BLACKJACK]
+    totals[22] = dist[blackjack3.BUST]
+    return totals
+
+
+def week5_strategy(stand_value, stand_on_soft):
+    return ('S' if stand_on_soft else 'H') + str(stand_value)
+
+
+def week5_hand(hands, stand_value, stand_on_soft, seed):
+    dist = blackjack3.outcome_distribution(week5_strategy(stand_value, stand_on_soft), hands,
+                                           blackjack3.CardSource(seed))
+    return week5_totals(dist)
+
+
+def week5_exact(hands, stand_value, stand_on_soft, seed):
+    return week5_totals(blackjack3.exact_outcome_distribution(week5_strategy(stand_value, stand_on_soft)))
+
+
+# Each engine plays hands of a strategy and returns the fraction of them
+# ending on each final total it reports, 22 being a bust. Exact engines
+# play no hands and are timed for the number of hands they stand in for.
+ENGINES = {
+    'week3-hand': week3_hand,
+    'week3-batch': week3_batch,
+    'week4-hand': week4_hand,
+    'week4-batch': week4_batch,
+    'week4-exact': week4_exact,
+    'week5-hand': week5_hand,
+    'week5-exact': week5_exact,
+}
+
+
+def max_error(totals, exact):
+    """Return the largest difference from the exact chance of a total, in percentage points"""
+    return max(abs(chance - exact[total]) for total, chance in totals.items()) * 100
+
+
+def benchmark(sizes, engines, repeat, stand_value, stand_on_soft, seed):
+    """Time every engine on every number of hands, return a list of results"""
+    exact = blackjack2.exact_distribution(stand_value, stand_on_soft)
+    results = []
+    for hands in sizes:
+        for engine in engines:
+            runs = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                totals = ENGINES[engine](hands, stand_value, stand_on_soft, seed)
+                runs.append(time.perf_counter() - start)
+            seconds = min(runs)
+            result = {'engine': engine, 'hands': hands, 'seconds': seconds,
+                      'hands_per_second': hands / seconds, 'max_error': max_error(totals, exact)}
+            logging.info(result)
+            results.append(result)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Return the results that are slower than the baseline by more than tolerance"""
+    previous = {(r['engine'], r['hands']): r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        before = previous.get((result['engine'], result['hands']))
+        if before and result['hands_per_second'] < before['hands_per_second'] * (1 - tolerance):
+            regressions.append((result, before))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the Blackjack engines against the exact distribution.')
+
+    parser.add_argument('-n', '--hands', dest='sizes', type=int, nargs='+',
+                        default=[10**4, 10**5], metavar='<hands>',
+                        help='numbers of hands to time (default: %(default)s)')
+
+    parser.add_argument('-e', '--engine', dest='engines', action='append',
+                        choices=list(ENGINES),
+                        help='engine to time, repeat for several (default: all)')
+
+    parser.add_argument('-s', '--strategy', default='S17',
+                        help="strategy played, like 'H17' or 'S17' (default: %(default)s)")
+
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='runs per engine and size, the fastest is kept '
+                             '(default: %(default)s)')
+
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the random cards (default: %(default)s)')
+
+    parser.add_argument('-o', '--output', default='bench_blackjack.json', metavar='<fname>',
+                        help='JSON file for the results (default: %(default)s)')
+
+    parser.add_argument('-b', '--baseline', metavar='<fname>',
+                        help='earlier results to compare against, exits with 1 '
+                             'if any engine got slower')
+
+    parser.add_argument('-t', '--tolerance', type=float, default=0.2,
+                        help='slowdown relative to the baseline that counts '
+                             'as a regression (default: %(default)s)')
+
+    parser.add_argument('-i', '--info', dest='log_level', action='store_const',
+                        const=logging.INFO, help='print progress')
+
+    args = parser.parse_args()
+    if args.log_level is not None:
+        logging.getLogger().setLevel(args.log_level)
+    if args.repeat < 1 or min(args.sizes) < 1:
+        parser.error("repeat and hands must be at least 1")
+    stand_value = 0
+    if args.strategy[:1] in ('H', 'S'):
+        try:
+            stand_value, stand_on_soft = blackjack3.parseStrategy(args.strategy)
+        except ValueError:
+            pass
+    if not 13 <= stand_value <= 21:
+        parser.error("strategy must be 'H' or 'S' and a number from 13 to 21")
+
+    # Read the baseline before the output is written, which may be the same file
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = benchmark(args.sizes, args.engines or list(ENGINES), args.repeat,
+                        stand_value, stand_on_soft, args.seed)
+
+    report = {'python': platform.python_version(), 'machine': platform.machine(), 'cpus': os.cpu_count(),
+              'strategy': args.strategy, 'seed': args.seed, 'results': results}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'engine':>12} {'hands':>10} {'seconds':>10} {'hands/s':>12} {'max error %':>12}")
+    for r in results:
+        print(f"{r['engine']:>12} {r['hands']:>10} {r['seconds']:>10.3f} "
+              f"{r['hands_per_second']:>12.0f} {r['max_error']:>12.3f}")
+
+    if baseline:
+        regressions = compare(results, baseline, args.tolerance)
+        for result, before in regressions:
+            print(f"REGRESSION {result['engine']} at {result['hands']} hands: "
+                  f"{result['hands_per_second']:.0f} hands/s, was {before['hands_per_second']:.0f}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,77 +1,334 @@
 #!/usr/bin/env python3
 
 import sys
+import time
 import random
+import os
 import csv
+import json
+import math
+import argparse
+import pstats
+import cProfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import repeat
 from collections import namedtuple, defaultdict
 
+from operator import length_hint
+
+import numpy as np
+
 Score = namedtuple('Score', 'total soft_ace_count')
 Stand = namedtuple('Stand', 'stand total')
 
+# Outcomes of a hand in increasing order of strength: index 0 is a bust,
+# 1 to 21 a final total, and 22 a Blackjack
+BUST = 0
+BLACKJACK = 22
+NUM_OUTCOMES = 23
+
+# Cards in the stream of each hand of a CommonCardSource, enough for 21 aces
+# and one more card
+HAND_CARDS = 22
+
+# Chance of each card value 1 to 10 for the exact engine, the face cards
+# counting as 10
+CARD_PROBS = [1 / 13] * 9 + [4 / 13]
+
+# Games played between checks of the confidence interval, and the normal
+# quantile of a 95% interval
+CI_BATCH = 1000
+Z_95 = 1.96
+
+# Games played by a cell between checkpoints
+CHECKPOINT_RUNS = 1000000
+
+# Totals covered by the stand tables of strategies, any higher total busts
+MAX_TOTAL = 31
+
+# Functions whose own time --stats adds up for each part of playing a hand,
+# when the run is also profiled with --profile. Hands are scored by Hand.add
+# and Strategy.play does the stand lookups itself.
+STATS_FUNCTIONS = {'score': ('add', 'score'), 'stand': ('stand', 'play'),
+                   'get_card': ('get_card', '_cards', '_uniforms')}
+
 def get_card():
     """Return a card value between 1 and 13"""
     return random.randint(1, 13)
 
+class CardSource:
+    """Cards between 1 and 13 drawn from blocks of pre-generated random numbers
+
+    Drawing a card is a single call to the next() of an iterator over the
+    current block, much cheaper than random.randint. The same seed always
+    gives the same cards. The cards dealt are counted by block, so counting
+    them costs nothing per card.
+    """
+
+    def __init__(self, seed=None, block_size=1 << 16):
+        self.rng = np.random.default_rng(seed)
+        self.block_size = block_size
+        self.skipped = 0
+        self._num_blocks = 0
+        self._block_cards = iter(())
+        self.get_card = self._cards().__next__
+
+    # Plain sources deal every card from the same stream
+    common = False
+
+    def _cards(self):
+        while True:
+            self._block_cards = iter(self.rng.integers(1, 14, size=self.block_size).tolist())
+            self._num_blocks += 1
+            yield from self._block_cards
+
+    @property
+    def cards(self):
+        """Number of cards dealt so far"""
+        return self._num_blocks * self.block_size - length_hint(self._block_cards)
+
+    def next_hand(self):
+        """Start the cards of a new hand, which only common sources act on"""
+
+    def skip_hand(self):
+        """Pass over a hand that is not played, counting it in skipped"""
+        self.skipped += 1
+
+
+class CommonCardSource(CardSource):
+    """Cards dealt from a fixed stream of HAND_CARDS cards for every hand
+
+    Hand i always gets row i of the stream, however many cards the earlier
+    hands used, so strategies playing from sources with the same seed see
+    the same cards (common random numbers) and their differences are less
+    noisy. With antithetic, every group of group_size rows is followed by
+    its mirror image, each card c replaced by 14 - c. The group is the hands
+    of one game, so that the hands within a game stay independent.
+    """
+
+    common = True
+
+    def __init__(self, seed=None, antithetic=False, group_size=1, block_size=1 << 12):
+        super().__init__(seed, block_size)
+        self.antithetic = antithetic
+        self.group_size = group_size
+        self._block = np.empty((0, HAND_CARDS), dtype=np.int64)
+        self._rows = []
+        self._pos = 0
+        self._row = iter(())
+        self._dealt = 0
+
+        # A card drawn before any next_hand() starts the first hand
+        self.get_card = self._first_card
+
+    def _first_card(self):
+        self.next_hand()
+        return self.get_card()
+
+    def _next_block(self):
+        if self.antithetic:
+            groups = self.rng.integers(1, 14, size=(self.block_size, self.group_size, HAND_CARDS))
+            self._block = np.stack([groups, 14 - groups], axis=1).reshape(-1, HAND_CARDS)
+        else:
+            self._block = self.rng.integers(1, 14, size=(self.block_size, HAND_CARDS))
+        self._rows = None
+        self._pos = 0
+
+    def skip_hand(self):
+        """Pass over the cards of a hand that is not played, counting it in skipped"""
+        self.skipped += 1
+        self.next_hand()
+
+    def next_hand(self):
+        """Deal the cards of the next hand from get_card"""
+        if self._pos == len(self._block):
+            self._next_block()
+        if self._rows is None:
+            self._rows = self._block.tolist()
+
+        # The cards left in the last row were never dealt
+        self._dealt += HAND_CARDS - length_hint(self._row)
+        self._row = iter(self._rows[self._pos])
+        self.get_card = self._row.__next__
+        self._pos += 1
+
+    @property
+    def cards(self):
+        """Number of cards dealt so far from the rows of next_hand()"""
+        return self._dealt - length_hint(self._row)
+
+    def rows(self, num_hands):
+        """Return the card streams of the next num_hands hands as an array"""
+        parts = []
+        while num_hands:
+            if self._pos == len(self._block):
+                self._next_block()
+            take = min(num_hands, len(self._block) - self._pos)
+            parts.append(self._block[self._pos:self._pos + take])
+            self._pos += take
+            num_hands -= take
+        return np.concatenate(parts) if parts else self._block[:0]
+
+
+def make_source(seed=None, cards='random', group_size=1, decks=0, penetration=0.75):
+    """Return a CardSource, or a CommonCardSource for cards 'common' or 'antithetic',
+    or a Shoe of decks decks if decks is not 0"""
+    if decks:
+        return Shoe(decks, penetration, seed, group_size)
+    if cards == 'random':
+        return CardSource(seed)
+    return CommonCardSource(seed, antithetic=cards == 'antithetic', group_size=group_size)
+
+
+class Shoe:
+    """A shoe of num_decks decks, dealt without replacement
+
+    The cards left are a count of each of the 13 ranks. A card is drawn by
+    picking a position among the cards left and walking the counts to its
+    rank, so nothing is ever shuffled. Once penetration of the shoe has been
+    dealt it is refilled, before the first hand of the next group of
+    group_size hands, e.g. the two hands of a game.
+    """
+
+    common = False
+
+    def __init__(self, num_decks=6, penetration=0.75, seed=None, group_size=1, block_size=1 << 16):
+        self.rng = np.random.default_rng(seed)
+        self.num_decks = num_decks
+        self.size = 52 * num_decks
+        self.cut = int(penetration * self.size)
+        self.group_size = group_size
+        self.block_size = block_size
+        self.skipped = 0
+        self._hands = 0
+        self._uniform = self._uniforms().__next__
+
+        # Cards dealt from earlier fillings of the shoe
+        self._dealt = 0
+        self.remaining = self.size
+        self.reshuffle()
+
+    def _uniforms(self):
+        while True:
+            yield from self.rng.random(self.block_size).tolist()
+
+    def reshuffle(self):
+        """Put all the cards back in the shoe"""
+        self._dealt += self.size - self.remaining
+        self.counts = [4 * self.num_decks] * 13
+        self.remaining = self.size
+
+    def skip_hand(self):
+        """Pass over a hand that is not played, counting it in skipped"""
+        self.skipped += 1
+        self.next_hand()
+
+    def next_hand(self):
+        """Start a new hand, refilling the shoe if it is time to"""
+        if self._hands % self.group_size == 0 and self.size - self.remaining >= self.cut:
+            self.reshuffle()
+        self._hands += 1
+
+    def get_card(self):
+        """Return a card value between 1 and 13 drawn from the shoe"""
+        if not self.remaining:
+            self.reshuffle()
+        position = int(self._uniform() * self.remaining)
+        counts = self.counts
+        card = 0
+        while position >= counts[card]:
+            position -= counts[card]
+            card += 1
+        counts[card] -= 1
+        self.remaining -= 1
+        return card + 1
+
+    @property
+    def cards(self):
+        """Number of cards dealt so far"""
+        return self._dealt + self.size - self.remaining
+
 
 class TieGame(Exception):
     pass
 
 
 class Hand:
-    """Class that encapsulates a Blackjack hand."""
+    """Class that encapsulates a Blackjack hand.
+
+    The score is kept up to date as each card is added, so scoring a hand
+    costs nothing however many cards it holds. The cards themselves are
+    only kept on request, if keep_cards is True. Random cards come from source, a
+    CardSource, or from get_card if there is none.
+    """
+
+    __slots__ = ('cards', 'num_cards', 'total', 'soft_ace_count', 'source')
 
-    def __init__(self, cards = None):
-        self.cards = cards if cards else []
+    def __init__(self, cards = None, keep_cards = False, source = None):
+        self.cards = [] if keep_cards else None
+        self.source = source
+        self.num_cards = 0
         self.total = 0
         self.soft_ace_count = 0
-        self.score()
+        if cards:
+            for card in cards:
+                self.add(card)
 
     def __str__(self):
-        return f"Hand of {self.cards}, with score {self.total}, and {self.soft_ace_count} soft aces."
+        cards = self.cards if self.cards is not None else f"{self.num_cards} cards"
+        return f"Hand of {cards}, with score {self.total}, and {self.soft_ace_count} soft aces."
+
+    def add(self, card):
+        """Add a card between 1 and 13 to the Hand and update its score."""
+        if self.cards is not None:
+            self.cards.append(card)
+        self.num_cards += 1
+
+        # Aces count as 11 and cards above 10 as 10
+        if card == 1:
+            self.total += 11
+            self.soft_ace_count += 1
+        else:
+            self.total += card if card < 11 else 10
+
+        # If score is above 21 and aces are present, subtract from the score
+        # until there are no more aces or the score is under twenty one
+        while self.soft_ace_count and self.total > 21:
+            self.total -= 10
+            self.soft_ace_count -= 1
 
     def add_card(self):
         """Add a random card to the Hand."""
-        self.cards.append(get_card())
-        self.score()
+        self.add(self.source.get_card() if self.source else get_card())
 
     def is_blackjack(self):
         """Return True if the cards in Hand are a Blackjack"""
-        return (self.total == 21 and len(self.cards) == 2)
+        return (self.total == 21 and self.num_cards == 2)
 
     def is_bust(self):
         """Return True if the Hand is a bust."""
         return self.total > 21
 
     def score(self):
-        """Calculate the score of a Blackjack hand."""
-
-        # Change all cards above 10 to equal 10
-        cards = [card if card < 11 else 10 for card in self.cards]
-        total, soft_ace_count = (0, 0)
-        
-        # Assume all aces are 11 and keep a count of the aces
-        for card in cards:
-            if card == 1:
-                total += 11
-                soft_ace_count += 1
-            else:
-                total += card
+        """Return the score of a Blackjack hand."""
+        return Score(self.total, self.soft_ace_count)
 
-        # If score is above 21 and aces are present, subtract from the score
-        # until there are no more aces or the score is under twenty one
-        while (soft_ace_count > 0 and total > 21):
-            total -= 10
-            soft_ace_count -= 1
+class Strategy:
+    """Class that encapsulates a stand on value Blackjack strategy.
 
-        self.total = total
-        self.soft_ace_count = soft_ace_count
-        return Score(total, soft_ace_count)
+    The decision for every (total, soft) hand is worked out once, into a
+    flat table indexed by 2 * total + soft, so standing is a lookup.
+    """
 
-class Strategy:
     def __init__(self, stand_on_value, stand_on_soft):
         self.stand_on_value = stand_on_value
         self.stand_on_soft = stand_on_soft
 
+        # A hand is never soft with more than one ace counting as 11
+        self.table = tuple(total > stand_on_value or (total == stand_on_value and (stand_on_soft or not soft))
+                           for total in range(MAX_TOTAL + 1) for soft in (False, True))
+
     def __repr__(self):
         return f"Strategy(stand_on_value={self.stand_on_value}, stand_on_soft={self.stand_on_soft})"
 
@@ -82,25 +339,28 @@ class Strategy:
 
     def stand(self, hand):
         """Determine whether to stand on a given Hand."""
-        assert(isinstance(hand, Hand))
-        total, soft_aces = hand.score()
-
-        if (total < self.stand_on_value):
-            return False
+        if hand.total > MAX_TOTAL:
+            return True
+        return self.table[2 * hand.total + hand.soft_ace_count]
 
-        if (total == self.stand_on_value and soft_aces and not self.stand_on_soft):
-            return False
+    def play(self, source=None):
+        """Play through a hand of Blackjack until it stands or busts.
 
-        return True
+        Cards are drawn from source, a CardSource, or get_card if there is none."""
+        if source:
+            source.next_hand()
+        draw = source.get_card if source else get_card
 
-    def play(self):
-        """Play through a hand of Blackjack until it stands or busts."""
-        # Hands start with 2 cards
-        hand = Hand(cards=[get_card(), get_card()])
+        # Hands start with 2 cards, which are not kept
+        hand = Hand(source=source)
+        hand.add(draw())
+        hand.add(draw())
 
-        # Continue to deal cards until stand condition is reached
-        while not self.stand(hand):
-            hand.add_card()
+        # Continue to deal cards until stand condition is reached, hands
+        # played here never go above MAX_TOTAL
+        table = self.table
+        while not table[2 * hand.total + hand.soft_ace_count]:
+            hand.add(draw())
 
         return hand
 
@@ -115,21 +375,33 @@ def parseStrategy(strategy):
     return (stand_value, stand_on_soft)
 
 
-def simulateBlackjackGame(playerStrategy, dealerStrategy):
+@lru_cache(maxsize=None)
+def getStrategy(strategy):
+    """Return the Strategy of a strategy string, built once and then reused"""
+    return Strategy(*parseStrategy(strategy))
+
+
+def simulateBlackjackGame(playerStrategy, dealerStrategy, source=None):
     """Simulate a hand of Blackjack
     
     Return True if player wins, False otherwise"""
-    pSoftVal, pSoftStand = parseStrategy(playerStrategy)
-    player = Strategy(pSoftVal, pSoftStand)
-    pHand = player.play()
+    return playGame(getStrategy(playerStrategy), getStrategy(dealerStrategy), source)
+
+
+def playGame(player, dealer, source=None):
+    """Play a hand of Blackjack between two Strategy objects
+
+    Return True if player wins, False otherwise"""
+    pHand = player.play(source)
 
-    # End game if the player busts
+    # End game if the player busts, passing over the dealer's cards of a
+    # common source so that every game uses two hands of it
     if pHand.is_bust():
+        if source:
+            source.skip_hand()
         return False
 
-    dSoftVal, dSoftStand = parseStrategy(dealerStrategy)
-    dealer = Strategy(dSoftVal, dSoftStand)
-    dHand = dealer.play()
+    dHand = dealer.play(source)
 
     # End game if dealer busts
     if dHand.is_bust():
@@ -147,7 +419,254 @@ def simulateBlackjackGame(playerStrategy, dealerStrategy):
     return False
     
 
-def build_table(num_runs, strategy_list):
+def outcome(hand):
+    """Return the outcome index of a finished Hand"""
+    if hand.is_bust():
+        return BUST
+    if hand.is_blackjack():
+        return BLACKJACK
+    return hand.total
+
+
+def outcome_distribution(strategy, num_runs, source=None):
+    """Return the fraction of num_runs hands played by strategy in each outcome"""
+    player = getStrategy(strategy)
+
+    counts = [0] * NUM_OUTCOMES
+    for _ in range(num_runs):
+        counts[outcome(player.play(source))] += 1
+    return [count / num_runs for count in counts]
+
+
+def exact_outcome_distribution(strategy):
+    """Return the exact chance of each outcome of strategy with an infinite deck"""
+    return exact_table_distribution(getStrategy(strategy).table)
+
+
+def exact_table_distribution(table):
+    """Return the exact chance of each outcome of a stand table like Strategy.table
+
+    This is Week4's exact_distribution for this week's outcomes: the chance
+    of each (hard total, holding an ace) state is passed on in increasing
+    order of hard total, with the stand looked up in table, and a two card
+    21 counted as a Blackjack.
+    """
+    # Hands only hit on 21 or less, so no hard total is past MAX_TOTAL
+    reach = [[0.0, 0.0] for _ in range(MAX_TOTAL + 1)]
+    dist = [0.0] * NUM_OUTCOMES
+
+    # Hands start with 2 cards, and an ace with a ten is a Blackjack
+    for first in range(1, 11):
+        for second in range(1, 11):
+            reach[first + second][first == 1 or second == 1] += CARD_PROBS[first - 1] * CARD_PROBS[second - 1]
+    if table[2 * 21 + 1]:
+        dist[BLACKJACK] = 2 * CARD_PROBS[0] * CARD_PROBS[9]
+        reach[11][1] -= dist[BLACKJACK]
+
+    for hard in range(2, MAX_TOTAL + 1):
+        for has_ace in (0, 1):
+            chance = reach[hard][has_ace]
+            if not chance:
+                continue
+
+            soft = has_ace and hard <= 11
+            total = hard + 10 if soft else hard
+            if table[2 * total + soft]:
+                dist[BUST if total > 21 else total] += chance
+                continue
+
+            for card in range(1, 11):
+                reach[hard + card][has_ace or card == 1] += chance * CARD_PROBS[card - 1]
+
+    return dist
+
+
+def win_chance(player_dist, dealer_dist):
+    """Return the chance that the player wins, from the two outcome distributions
+
+    The player wins with any outcome stronger than the dealer's, except a
+    bust. Equal outcomes are ties, thrown out like TieGame, so they are not
+    wins either.
+    """
+    chance = 0.0
+    dealer_below = dealer_dist[BUST]
+    for index in range(1, NUM_OUTCOMES):
+        chance += player_dist[index] * dealer_below
+        dealer_below += dealer_dist[index]
+    return chance
+
+
+def half_width(count, runs):
+    """Return the half-width of the 95% confidence interval of the win percentage
+    of count wins in runs games"""
+    p = count / runs
+    return Z_95 * math.sqrt(p * (1 - p) / runs) * 100
+
+
+def play_chunk(playerStrategy, dealerStrategy, num_runs, seed=None, ci=None, cards='random',
+               tally=None, decks=0, penetration=0.75):
+    """Play up to CHECKPOINT_RUNS more games of a cell, continuing from tally
+
+    A tally is a dict of the games won, the games that were not ties, the
+    games played, whether the cell is done and the state of its random
+    generator, which is all that is needed to carry on later, and the hands
+    played and cards dealt by this chunk alone. Every game is two hands,
+    less the dealer hands skipped once the player has bust. Each chunk
+    starts a fresh block of cards, or a full shoe, from that state, so a
+    cell gives the same results however its chunks are spread over runs of
+    the program.
+
+    With ci, games are played in batches until the 95% confidence interval
+    of the win percentage is narrower than +/- ci, or num_runs are used up.
+    """
+    player = getStrategy(playerStrategy)
+    dealer = getStrategy(dealerStrategy)
+    source = make_source(seed, cards, 2, decks, penetration)
+    winCount, countedRuns, runs = (0, 0, 0)
+    if tally:
+        source.rng.bit_generator.state = tally['rng']
+        winCount, countedRuns, runs = (tally['wins'], tally['counted'], tally['runs'])
+    start = runs
+
+    end = min(num_runs, runs + CHECKPOINT_RUNS)
+    done = False
+    while runs < end and not done:
+        batch = min(CI_BATCH if ci else end, end - runs)
+        countedRuns += batch
+        for run in range(batch):
+            try:
+                if playGame(player, dealer, source):
+                    winCount += 1
+            except TieGame:
+                countedRuns -= 1
+        runs += batch
+        done = bool(ci) and half_width(winCount, runs) < ci
+
+    return {'wins': winCount, 'counted': countedRuns, 'runs': runs,
+            'done': done or runs == num_runs, 'rng': source.rng.bit_generator.state,
+            'hands': 2 * (runs - start) - source.skipped, 'cards': source.cards}
+
+
+def play_cell(playerStrategy, dealerStrategy, num_runs, seed=None, ci=None, cards='random',
+              decks=0, penetration=0.75):
+    """Play num_runs games of a player strategy against a dealer strategy
+
+    Return the number of games won, the number that were not ties and the
+    number played"""
+    tally = None
+    while not tally or not tally['done']:
+        tally = play_chunk(playerStrategy, dealerStrategy, num_runs, seed, ci, cards, tally,
+                           decks, penetration)
+    return (tally['wins'], tally['counted'], tally['runs'])
+
+
+def save_checkpoint(fname, checkpoint):
+    """Write a checkpoint so that a reader never sees a partial file"""
+    tmp = fname + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp, fname)
+
+
+def load_checkpoint(fname, settings, seed=None):
+    """Return the seed and cell tallies of a checkpoint made with settings"""
+    with open(fname) as f:
+        checkpoint = json.load(f)
+    if checkpoint['settings'] != settings or seed not in (None, checkpoint['entropy']):
+        raise ValueError(f"{fname} was made with different settings: {checkpoint['settings']}, "
+                         f"seed {checkpoint['entropy']}")
+    tallies = {tuple(cell.split(',')): tally for cell, tally in checkpoint['cells'].items()}
+    return (checkpoint['entropy'], tallies)
+
+
+def sampled_distribution(strategy, num_runs, seed=None, cards='random', decks=0, penetration=0.75):
+    """Return outcome_distribution with cards from a source seeded with seed,
+    and the number of cards dealt"""
+    source = make_source(seed, cards, 1, decks, penetration)
+    return (outcome_distribution(strategy, num_runs, source), source.cards)
+
+
+def build_table(num_runs, strategy_list, engine='game', seed=None, workers=1, ci=None,
+                cards='random', checkpoint=None, resume=False, decks=0, penetration=0.75):
+    """Write the percentage of games won by each player and dealer strategy
+
+    The game engine plays num_runs games for every pair of strategies. The
+    distribution engine plays num_runs hands of every strategy once and
+    combines their outcomes, and the exact engine computes the outcomes
+    without sampling, since player and dealer hands are independent.
+
+    Every cell, or every strategy for the distribution engine, draws its
+    cards from its own stream spawned from a SeedSequence of seed, and the
+    streams are shared out among workers processes. The table only depends
+    on seed, whatever the number of workers. With cards 'common' or
+    'antithetic', every cell or strategy instead plays the same stream of
+    a CommonCardSource, so differences between cells are less noisy. With
+    decks, cards are dealt from a Shoe of that many decks, refilled once
+    penetration of it has been dealt, instead of an infinite deck.
+
+    With ci, each cell of the game engine stops early once its win
+    percentage is known to +/- ci, and two more tables follow with the
+    half-width reached (rows CI-) and the games played (rows N-).
+
+    The game engine plays every cell a chunk at a time. With checkpoint,
+    the tallies of all cells are saved to that file after every round of
+    chunks, and with resume the cells carry on from the saved tallies. The
+    seed is saved too, so a resumed table is the same as one made in a
+    single run.
+
+    Return the number of hands played and cards dealt by this run, which
+    are 0 for the exact engine.
+    """
+    settings = {'num_runs': num_runs, 'strategies': strategy_list, 'ci': ci, 'cards': cards,
+                'decks': decks, 'penetration': penetration}
+    tallies = {}
+    if resume:
+        seed, tallies = load_checkpoint(checkpoint, settings, seed)
+    seeds = np.random.SeedSequence(seed)
+    num_streams = len(strategy_list) ** 2 if engine == 'game' else len(strategy_list)
+    if cards == 'random':
+        streams = seeds.spawn(num_streams)
+    else:
+        streams = seeds.spawn(1) * num_streams
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    mapper = executor.map if executor else map
+    hands, num_cards = (0, 0)
+    try:
+        if engine == 'game':
+            cells = [(p, d) for p in strategy_list for d in strategy_list]
+            cell_streams = dict(zip(cells, streams))
+            pending = [cell for cell in cells if not tallies.get(cell, {}).get('done')]
+            while pending:
+                chunks = list(mapper(play_chunk, [p for p, _ in pending], [d for _, d in pending],
+                                     repeat(num_runs), [cell_streams[cell] for cell in pending],
+                                     repeat(ci), repeat(cards), [tallies.get(cell) for cell in pending],
+                                     repeat(decks), repeat(penetration)))
+                hands += sum(tally['hands'] for tally in chunks)
+                num_cards += sum(tally['cards'] for tally in chunks)
+                tallies.update(zip(pending, chunks))
+                if checkpoint:
+                    save_checkpoint(checkpoint, {'settings': settings, 'entropy': seeds.entropy,
+                                                 'cells': {','.join(cell): tally
+                                                           for cell, tally in tallies.items()}})
+                pending = [cell for cell in pending if not tallies[cell]['done']]
+            tallies = {cell: (t['wins'], t['counted'], t['runs']) for cell, t in tallies.items()}
+            percents = {cell: winCount / runs * 100 for cell, (winCount, _, runs) in tallies.items()}
+        else:
+            if engine == 'distribution':
+                sampled = list(mapper(sampled_distribution, strategy_list, repeat(num_runs),
+                                      streams, repeat(cards), repeat(decks), repeat(penetration)))
+                dists = [dist for dist, _ in sampled]
+                hands = num_runs * len(strategy_list)
+                num_cards = sum(dealt for _, dealt in sampled)
+            else:
+                dists = map(exact_outcome_distribution, strategy_list)
+            dists = dict(zip(strategy_list, dists))
+            percents = {(p, d): win_chance(dists[p], dists[d]) * 100
+                        for p in strategy_list for d in strategy_list}
+    finally:
+        if executor:
+            executor.shutdown()
+
     writer = csv.writer(sys.stdout)
     writer.writerow(['P-Strategy'] + ['D-' + strat for strat in strategy_list])
 
@@ -155,17 +674,74 @@ def build_table(num_runs, strategy_list):
     for playerStrategy in strategy_list:
         row = ['P-' + playerStrategy]   # Row title
         for dealerStrategy in strategy_list:
-            winCount = 0
-            countedRuns = num_runs
-            for run in range(num_runs):
-                try:
-                    if simulateBlackjackGame(playerStrategy, dealerStrategy):
-                        winCount += 1
-                except TieGame:
-                    countedRuns -= 1
-            row.append(f"{winCount / num_runs * 100:.2f}")
+            row.append(f"{percents[playerStrategy, dealerStrategy]:.2f}")
         writer.writerow(row)
 
+    if ci and engine == 'game':
+        for playerStrategy in strategy_list:
+            cells = [tallies[playerStrategy, dealerStrategy] for dealerStrategy in strategy_list]
+            writer.writerow(['CI-P-' + playerStrategy] + [f"{half_width(winCount, runs):.3f}"
+                                                          for winCount, _, runs in cells])
+        for playerStrategy in strategy_list:
+            cells = [tallies[playerStrategy, dealerStrategy] for dealerStrategy in strategy_list]
+            writer.writerow(['N-P-' + playerStrategy] + [runs for _, _, runs in cells])
+
+    return (hands, num_cards)
+
+
+def run_profiled(function, args, profile=None, stats=None, hands=None, cells=1, cards=None):
+    """Return function(*args), timed for stats and run under cProfile for profile
+
+    The profile is written to the file profile, for pstats or snakeviz, and
+    the throughput to the file stats as JSON. hands and cards are the number
+    of hands played and cards dealt, or functions of the result returning
+    them. With stats alone the run is timed as it is, as cProfile slows it
+    down several times.
+    """
+    if not (profile or stats):
+        return function(*args)
+
+    profiler = cProfile.Profile() if profile else None
+    start = time.perf_counter()
+    result = profiler.runcall(function, *args) if profiler else function(*args)
+    seconds = time.perf_counter() - start
+
+    if profile:
+        profiler.dump_stats(profile)
+    if stats:
+        num_hands = hands(result) if callable(hands) else hands
+        num_cards = cards(result) if callable(cards) else cards
+        with open(stats, 'w') as f:
+            json.dump(throughput(seconds, num_hands, num_cards, cells, profiler), f, indent=2)
+    return result
+
+
+def throughput(seconds, hands, cards=None, cells=1, profiler=None):
+    """Return hands per second, time per cell, cards per hand and where the time went
+
+    cards_per_hand is left out if the cards dealt are not known. With a
+    profiler, the split gives the time spent in the functions of each group
+    of STATS_FUNCTIONS themselves, and the times are marked as profiled, as
+    they are slower than a plain run.
+    """
+    result = {
+        'seconds': seconds,
+        'hands': hands,
+        'hands_per_second': hands / seconds if seconds else None,
+        'cells': cells,
+        'seconds_per_cell': seconds / cells,
+        'profiled': profiler is not None,
+    }
+    if cards is not None and hands:
+        result['cards_per_hand'] = cards / hands
+    if profiler:
+        own_time = defaultdict(float)
+        for (_, _, name), (_, _, tottime, _, _) in pstats.Stats(profiler).stats.items():
+            own_time[name] += tottime
+        result['time_split'] = {group: sum(own_time[name] for name in names)
+                                for group, names in STATS_FUNCTIONS.items()}
+    return result
+
 
 def makeStrategyList(lower_limit, upper_limit):
     """Makes list of Blackjack strategies as strings"""
@@ -177,15 +753,90 @@ def makeStrategyList(lower_limit, upper_limit):
 
 
 def main():
-    # Input validation
-    if (len(sys.argv) != 2):
-        print("Please provide 1 argument: number of simulations to run")
-        sys.exit(1)
-    num_runs = int(sys.argv[1])
+    parser = argparse.ArgumentParser(
+        description='Tabulate the percentage of Blackjack games won by each '
+                    'player strategy against each dealer strategy.')
+
+    parser.add_argument('num_runs', type=int, metavar='<num-simulations>',
+                        help='number of games per pair of strategies, or of '
+                             'hands per strategy with the distribution engine; '
+                             'the most to play with --ci')
+
+    parser.add_argument('--engine', choices=['game', 'distribution', 'exact'], default='game',
+                        help='game plays every pair of strategies, distribution '
+                             'plays every strategy once and combines the outcomes, '
+                             'exact computes the outcomes without sampling '
+                             '(default: %(default)s)')
+
+    parser.add_argument('--seed', type=int,
+                        help='seed of the random cards, for repeatable runs')
+
+    parser.add_argument('-w', '--workers', type=int, default=1, metavar='<n>',
+                        help='processes playing the cells of the table, which '
+                             'does not change the results (default: %(default)s)')
+
+    parser.add_argument('--ci', type=float, metavar='<percent>',
+                        help='play each pair of strategies until the 95%% '
+                             'confidence interval of its win percentage is within '
+                             '+/- this, and add the CI and games played; game engine only')
+
+    parser.add_argument('--cards', choices=['random', 'common', 'antithetic'], default='random',
+                        help='random deals every cell its own cards, common deals '
+                             'every cell the same cards for each game, antithetic '
+                             'also mirrors half of those games, so differences '
+                             'between cells are less noisy (default: %(default)s)')
+
+    parser.add_argument('--checkpoint', metavar='<fname>',
+                        help='save the games played so far to this file as the '
+                             'table is built, game engine only')
+
+    parser.add_argument('--resume', action='store_true',
+                        help='carry on from the games saved in the --checkpoint file')
+
+    parser.add_argument('--decks', type=int, default=0, metavar='<n>',
+                        help='deal from a shoe of this many decks instead of an '
+                             'infinite deck (default: infinite)')
+
+    parser.add_argument('--penetration', type=float, default=0.75,
+                        help='fraction of a shoe dealt before it is refilled '
+                             '(default: %(default)s)')
+
+    parser.add_argument('--profile', metavar='<fname>',
+                        help='write cProfile output of the run to this file')
+
+    parser.add_argument('--stats', metavar='<fname>',
+                        help='write hands per second, time per cell and cards per '
+                             'hand to this file as JSON, and with --profile the '
+                             'time spent in score, stand and get_card')
+
+    args = parser.parse_args()
+    if args.num_runs < 1:
+        parser.error("number of simulations must be at least 1")
+    if args.workers < 1:
+        parser.error("workers must be at least 1")
+    if args.ci is not None and (args.ci <= 0 or args.engine != 'game'):
+        parser.error("--ci must be positive and needs the game engine")
+    if args.decks < 0 or not 0 < args.penetration <= 1:
+        parser.error("decks must not be negative and penetration must be between 0 and 1")
+    if args.decks and (args.engine == 'exact' or args.cards != 'random'):
+        parser.error("--decks needs a sampling engine and random cards")
+    if args.checkpoint and args.engine != 'game':
+        parser.error("--checkpoint needs the game engine")
+    if args.profile and args.workers > 1:
+        parser.error("--profile only sees this process, use one worker")
+    if args.resume and not (args.checkpoint and os.path.exists(args.checkpoint)):
+        parser.error("--resume needs an existing --checkpoint file")
 
     # Make a strategy list and build the simulation table
     strategy_list = makeStrategyList(13, 20)
-    build_table(num_runs, strategy_list)
+    try:
+        run_profiled(build_table, (args.num_runs, strategy_list, args.engine, args.seed,
+                                   args.workers, args.ci, args.cards, args.checkpoint,
+                                   args.resume, args.decks, args.penetration),
+                     args.profile, args.stats, hands=lambda counts: counts[0],
+                     cells=len(strategy_list) ** 2, cards=lambda counts: counts[1])
+    except ValueError as e:
+        parser.error(str(e))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+
+# Finds the best player stand thresholds against each dealer strategy, with
+# separate thresholds for hard and soft totals. Outcome distributions are
+# computed exactly once per policy, and candidates that cannot be best are
+# pruned instead of playing every pair of policies.
+
+import sys
+import csv
+import argparse
+from functools import lru_cache
+
+from blackjack3 import (BUST, BLACKJACK, MAX_TOTAL, exact_table_distribution,
+                        makeStrategyList, parseStrategy, win_chance)
+
+# Thresholds searched, soft hands are never below 12
+MAX_THRESHOLD = 21
+MIN_SOFT_THRESHOLD = 12
+
+
+def policy_name(policy):
+    """Return the name of a (hard, soft) threshold policy, e.g. H17S18"""
+    return f"H{policy[0]}S{policy[1]}"
+
+
+def strategy_policy(strategy):
+    """Return the (hard, soft) thresholds of a strategy string like 'H17'
+
+    S17 stands on any 17, while H17 hits a soft 17 and so stands on soft 18.
+    """
+    stand_value, stand_on_soft = parseStrategy(strategy)
+    return (stand_value, stand_value if stand_on_soft else stand_value + 1)
+
+
+def policy_table(policy):
+    """Return the stand table of a policy, laid out like Strategy.table"""
+    hard, soft = policy
+    return tuple(total >= (soft if is_soft else hard)
+                 for total in range(MAX_TOTAL + 1) for is_soft in (False, True))
+
+
+@lru_cache(maxsize=None)
+def policy_distribution(policy):
+    """Return the exact outcome distribution of a policy, computed once"""
+    return tuple(exact_table_distribution(policy_table(policy)))
+
+
+def cumulative(dist):
+    """Return the chance of each outcome or a weaker one"""
+    total = 0.0
+    cdf = []
+    for chance in dist:
+        total += chance
+        cdf.append(total)
+    return cdf
+
+
+def dominates(a, b, tolerance=1e-12):
+    """Return True if distribution a is stochastically at least as strong as b
+
+    The chance of a win only grows with a stronger outcome, so a policy whose
+    outcomes dominate another's wins at least as often against any dealer.
+    """
+    return all(x <= y + tolerance for x, y in zip(cumulative(a), cumulative(b)))
+
+
+def undominated(policies):
+    """Return the policies whose outcomes are not dominated by another's
+
+    Of policies with the same outcomes, only the first is kept.
+    """
+    dists = {policy: policy_distribution(policy) for policy in policies}
+    kept = []
+    for policy in policies:
+        if not any(dominates(dists[other], dists[policy])
+                   and (other in kept or not dominates(dists[policy], dists[other]))
+                   for other in policies if other != policy):
+            kept.append(policy)
+    return kept
+
+
+def win_bound(player_dist, dealer_cdf):
+    """Return an upper bound of win_chance from the player's bust and Blackjack chances
+
+    A total beats at most the dealer outcomes up to 20, and a Blackjack at
+    most those up to 21.
+    """
+    totals = 1 - player_dist[BUST] - player_dist[BLACKJACK]
+    return totals * dealer_cdf[20] + player_dist[BLACKJACK] * dealer_cdf[21]
+
+
+def best_response(dealer, candidates):
+    """Return the best candidate policy against a dealer policy
+
+    Candidates are tried in decreasing order of win_bound, and the search
+    stops once no bound is above the best win chance found.
+
+    return: (policy, win chance, number of win chances computed)
+    """
+    dealer_dist = policy_distribution(dealer)
+    dealer_cdf = cumulative(dealer_dist)
+    bounds = sorted(((win_bound(policy_distribution(policy), dealer_cdf), policy)
+                     for policy in candidates), reverse=True)
+
+    best, best_chance, evaluated = (None, -1.0, 0)
+    for bound, policy in bounds:
+        if bound <= best_chance:
+            break
+        chance = win_chance(policy_distribution(policy), dealer_dist)
+        evaluated += 1
+        if chance > best_chance:
+            best, best_chance = (policy, chance)
+    return (best, best_chance, evaluated)
+
+
+def search(dealers, min_threshold=4):
+    """Return the best response to each dealer policy, as a list of rows
+
+    Players are searched over every hard threshold from min_threshold to 21
+    and soft threshold from 12 to 21, less those that are dominated.
+    """
+    policies = [(hard, soft) for hard in range(min_threshold, MAX_THRESHOLD + 1)
+                for soft in range(MIN_SOFT_THRESHOLD, MAX_THRESHOLD + 1)]
+    candidates = undominated(policies)
+
+    rows = []
+    for dealer in dealers:
+        best, chance, evaluated = best_response(dealer, candidates)
+        rows.append({'dealer': dealer, 'player': best, 'win': chance,
+                     'candidates': len(candidates), 'evaluated': evaluated})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Find the player stand thresholds that win most often '
+                    'against each dealer strategy.')
+
+    parser.add_argument('dealers', nargs='*', metavar='<strategy>',
+                        help="dealer strategies like 'H17' or 'S17' "
+                             "(default: H13 to S20)")
+
+    parser.add_argument('--min-threshold', type=int, default=4, metavar='<n>',
+                        help='lowest hard threshold searched (default: %(default)s)')
+
+    args = parser.parse_args()
+    if not 4 <= args.min_threshold <= MAX_THRESHOLD:
+        parser.error(f"the lowest threshold must be between 4 and {MAX_THRESHOLD}")
+
+    strategies = args.dealers or makeStrategyList(13, 20)
+    try:
+        dealers = [strategy_policy(strategy) for strategy in strategies]
+    except ValueError:
+        dealers = []
+    if len(dealers) != len(strategies) or any(strategy[0] not in 'HS' for strategy in strategies) \
+            or not all(4 <= hard <= MAX_THRESHOLD for hard, _ in dealers):
+        parser.error(f"dealer strategies must be 'H' or 'S' and a number from 4 to {MAX_THRESHOLD}")
+
+    writer = csv.writer(sys.stdout)
+    writer.writerow(['D-Strategy', 'P-Policy', 'Win', 'Candidates', 'Evaluated'])
+    for strategy, row in zip(strategies, search(dealers, args.min_threshold)):
+        writer.writerow(['D-' + strategy, 'P-' + policy_name(row['player']),
+                         f"{row['win'] * 100:.2f}", row['candidates'], row['evaluated']])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+import io
+import os
+import sys
+import json
+import tempfile
+import unittest
+from contextlib import redirect_stdout, redirect_stderr
+from unittest import mock
+
+import bench_blackjack
+
+class TestBenchBlackjack(unittest.TestCase):
+
+    def run_main(self, *args):
+        with mock.patch.object(sys, 'argv', ['bench_blackjack.py'] + list(args)), \
+                redirect_stdout(io.StringIO()) as out, redirect_stderr(io.StringIO()):
+            bench_blackjack.main()
+        return out.getvalue()
+
+    def test_main(self):
+        # Every engine gets a row, and only sampling engines differ from the exact distribution
+        with tempfile.TemporaryDirectory() as tmp:
+            fname = os.path.join(tmp, 'bench.json')
+            out = self.run_main('-n', '2000', '-r', '1', '-o', fname)
+            with open(fname) as f:
+                report = json.load(f)
+
+        lines = out.splitlines()
+        self.assertListEqual(lines[0].split(), ['engine', 'hands', 'seconds', 'hands/s', 'max', 'error', '%'])
+        self.assertListEqual([line.split()[0] for line in lines[1:]], list(bench_blackjack.ENGINES))
+        for result in report['results']:
+            with self.subTest(engine=result['engine']):
+                self.assertEqual(result['hands'], 2000)
+                if result['engine'].endswith('exact'):
+                    self.assertAlmostEqual(result['max_error'], 0)
+                else:
+                    self.assertTrue(0 < result['max_error'] < 5)
+
+    def write_baseline(self, fname, speedup):
+        # Save a run of week4-batch, as if it had been speedup times faster
+        self.run_main('-n', '500', '-r', '1', '-e', 'week4-batch', '-o', fname)
+        with open(fname) as f:
+            report = json.load(f)
+        for result in report['results']:
+            result['hands_per_second'] *= speedup
+        with open(fname, 'w') as f:
+            json.dump(report, f)
+
+    def test_baseline(self):
+        # A run far slower than its baseline is a regression, a run as fast is not
+        with tempfile.TemporaryDirectory() as tmp:
+            baseline, fname = (os.path.join(tmp, 'baseline.json'), os.path.join(tmp, 'bench.json'))
+            self.write_baseline(baseline, 100)
+            with self.assertRaises(SystemExit) as cm:
+                self.run_main('-n', '500', '-r', '1', '-e', 'week4-batch', '-o', fname, '-b', baseline)
+            self.assertEqual(cm.exception.code, 1)
+
+            self.write_baseline(baseline, 0.01)
+            self.run_main('-n', '500', '-r', '1', '-e', 'week4-batch', '-o', fname, '-b', baseline)
+
+    def test_baseline_same_file(self):
+        # The baseline is read before the output overwrites it
+        with tempfile.TemporaryDirectory() as tmp:
+            fname = os.path.join(tmp, 'bench.json')
+            self.write_baseline(fname, 100)
+            with self.assertRaises(SystemExit) as cm:
+                self.run_main('-n', '500', '-r', '1', '-e', 'week4-batch', '-o', fname, '-b', fname)
+            self.assertEqual(cm.exception.code, 1)
+
+    def test_invalid_strategy(self):
+        # Strategies that can not be parsed are usage errors
+        for strategy in ['', 'X17', 'H', 'H12']:
+            with self.subTest(strategy=strategy):
+                with self.assertRaises(SystemExit) as cm:
+                    self.run_main('-s', strategy)
+                self.assertEqual(cm.exception.code, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,17 @@
 #!/usr/bin/env python3
 
+import io
+import os
+import json
+import random
+import tempfile
 import unittest
-from blackjack3 import Hand, Strategy
+from contextlib import redirect_stdout
+from unittest import mock
+
+import blackjack3
+from blackjack3 import (CardSource, CommonCardSource, Shoe, Hand, Strategy, TieGame, getStrategy, build_table, run_profiled, play_cell, half_width, simulateBlackjackGame, outcome_distribution,
+                        exact_outcome_distribution, win_chance, BLACKJACK)
 
 class TestBlackjack(unittest.TestCase):
 
@@ -25,6 +35,20 @@ class TestBlackjack(unittest.TestCase):
                 self.assertEqual(h.total, test_case['total'])
                 self.assertEqual(h.soft_ace_count, test_case['soft_aces'])
 
+                # Adding the cards one at a time gives the same score
+                h = Hand()
+                for card in test_case['hand']:
+                    h.add(card)
+                self.assertEqual(h.score(), (test_case['total'], test_case['soft_aces']))
+                self.assertEqual(h.num_cards, len(test_case['hand']))
+                self.assertIsNone(h.cards)
+
+    def test_hand_blackjack(self):
+        # Only a two card 21 is a Blackjack
+        self.assertTrue(Hand([1, 12]).is_blackjack())
+        self.assertFalse(Hand([1, 5, 5]).is_blackjack())
+        self.assertTrue(Hand([1, 13], keep_cards=True).is_blackjack())
+
     def test_strategy_stand_true(self):
         s = Strategy(17, True)
         self.assertTrue(s.stand(Hand([1,1,5])))
@@ -45,6 +69,205 @@ class TestBlackjack(unittest.TestCase):
         s = Strategy(17, True)
         self.assertFalse(s.stand(Hand([1,1])))
 
+    def test_card_source(self):
+        # The same seed plays the same hands and games
+        a, b = CardSource(1), CardSource(1)
+        for _ in range(100):
+            self.assertEqual(Strategy(17, True).play(a).total, Strategy(17, True).play(b).total)
+        self.assertEqual(outcome_distribution('H15', 1000, CardSource(2)),
+                         outcome_distribution('H15', 1000, CardSource(2)))
+
+        # A Hand draws its random cards from its source
+        h = Hand([5], keep_cards=True, source=CardSource(3))
+        h.add_card()
+        self.assertEqual(h.cards, [5, CardSource(3).get_card()])
+
+    def test_shoe(self):
+        # A shoe deals every card of its decks once before it runs out
+        shoe = Shoe(2, penetration=1, seed=1)
+        cards = sorted(shoe.get_card() for _ in range(104))
+        self.assertEqual(cards, sorted(list(range(1, 14)) * 8))
+
+        # It is only refilled before the first hand of a game past the cut
+        shoe = Shoe(1, penetration=0.5, seed=2, group_size=2)
+        shoe.next_hand()
+        for _ in range(30):
+            shoe.get_card()
+        shoe.next_hand()
+        self.assertEqual(shoe.remaining, 22)
+        shoe.next_hand()
+        self.assertEqual(shoe.remaining, 52)
+
+        # Strategies play from a shoe like any other source
+        hand = Strategy(17, True).play(shoe)
+        self.assertGreaterEqual(hand.total, 17)
+        self.assertEqual(shoe.remaining, 52 - hand.num_cards)
+
+    def test_strategy_table(self):
+        # The stand table follows the stand on value rule for every hand
+        for stand_value in range(13, 22):
+            for stand_on_soft in (False, True):
+                s = Strategy(stand_value, stand_on_soft)
+                for total in range(4, 40):
+                    for soft in (0, 1):
+                        with self.subTest(strategy=str(s), total=total, soft=soft):
+                            h = Hand()
+                            h.total, h.soft_ace_count = total, soft
+                            expected = total > stand_value or (total == stand_value and (stand_on_soft or not soft))
+                            self.assertEqual(s.stand(h), expected)
+
+    def test_get_strategy(self):
+        # Strategy strings are parsed once and the Strategy reused
+        s = getStrategy('S17')
+        self.assertIs(getStrategy('S17'), s)
+        self.assertEqual((s.stand_on_value, s.stand_on_soft), (17, True))
+        self.assertEqual(str(getStrategy('H13')), 'H13')
+
+    def test_exact_outcome_distribution(self):
+        # Outcomes sum to 1, and a Blackjack is an ace with a ten
+        for strategy in ['H13', 'S13', 'H17', 'S17', 'H20', 'S20']:
+            with self.subTest(strategy=strategy):
+                dist = exact_outcome_distribution(strategy)
+                self.assertAlmostEqual(sum(dist), 1)
+                self.assertAlmostEqual(dist[BLACKJACK], 2 * 4 / 169)
+                self.assertEqual(sum(dist[1:int(strategy[1:])]), 0)
+
+    def test_outcome_distribution(self):
+        # Sampled outcomes are close to the exact ones
+        random.seed(1)
+        sampled = outcome_distribution('S17', 20000)
+        exact = exact_outcome_distribution('S17')
+        for index in range(len(exact)):
+            self.assertAlmostEqual(sampled[index], exact[index], delta=0.015)
+
+    def test_win_chance(self):
+        # A player who busts loses even when the dealer busts
+        self.assertEqual(win_chance([1] + [0] * 22, [1] + [0] * 22), 0)
+        # A Blackjack beats a 21 and ties with a Blackjack
+        self.assertEqual(win_chance([0] * 22 + [1], [0] * 21 + [1, 0]), 1)
+        self.assertEqual(win_chance([0] * 22 + [1], [0] * 22 + [1]), 0)
+
+    def test_win_chance_matches_games(self):
+        # Combining outcomes gives the same win rate as playing games
+        random.seed(2)
+        num_runs = 20000
+        wins = 0
+        for _ in range(num_runs):
+            try:
+                wins += simulateBlackjackGame('H15', 'S17')
+            except TieGame:
+                pass
+        expected = win_chance(exact_outcome_distribution('H15'), exact_outcome_distribution('S17'))
+        self.assertAlmostEqual(wins / num_runs, expected, delta=0.015)
+
+    def test_play_cell_ci(self):
+        # Games stop once the win percentage is known well enough
+        winCount, countedRuns, runs = play_cell('H15', 'S17', 10**6, seed=1, ci=2)
+        self.assertLess(half_width(winCount, runs), 2)
+        self.assertLess(runs, 10**6)
+        self.assertEqual(runs % 1000, 0)
+        self.assertLessEqual(winCount, countedRuns)
+
+        # The number of runs is still the most played
+        self.assertEqual(play_cell('H15', 'S17', 1500, seed=1, ci=0.01)[2], 1500)
+        self.assertEqual(play_cell('H15', 'S17', 1500, seed=1)[2], 1500)
+
+    def test_common_card_source(self):
+        # Every hand starts its own row, and antithetic games mirror in pairs
+        source = CommonCardSource(1, antithetic=True, group_size=2, block_size=8)
+        rows = CommonCardSource(1, antithetic=True, group_size=2, block_size=8).rows(40)
+        for row in rows:
+            source.next_hand()
+            self.assertEqual([source.get_card(), source.get_card()], list(row[:2]))
+        self.assertTrue((rows[0:2] + rows[2:4] == 14).all())
+        self.assertTrue((rows[36:38] + rows[38:40] == 14).all())
+
+        # A card drawn before next_hand() starts the first hand
+        source = CommonCardSource(1)
+        first = source.get_card()
+        self.assertEqual([first, source.get_card()], list(CommonCardSource(1).rows(1)[0, :2]))
+
+    def test_common_cards_reduce_noise(self):
+        # Two strategies on common cards differ far less from seed to seed
+        spreads = {}
+        for cards in ('random', 'common'):
+            diffs = []
+            for seed in range(20):
+                other = seed if cards == 'common' else seed + 100
+                diffs.append(play_cell('H17', 'S17', 300, seed, cards=cards)[0]
+                             - play_cell('S17', 'S17', 300, other, cards=cards)[0])
+            spreads[cards] = max(diffs) - min(diffs)
+        self.assertLess(spreads['common'] * 3, spreads['random'])
+
+    def test_run_profiled(self):
+        # Every game deals a player hand, and a dealer hand unless the player busts
+        for cards in ('random', 'common', 'antithetic'):
+            with self.subTest(cards=cards), tempfile.TemporaryDirectory() as tmp:
+                stats = os.path.join(tmp, 'stats.json')
+                with redirect_stdout(io.StringIO()):
+                    run_profiled(build_table, (200, ['H15', 'S17'], 'game', 1, 1, None, cards), stats=stats,
+                                 hands=lambda counts: counts[0], cells=4, cards=lambda counts: counts[1])
+                with open(stats) as f:
+                    result = json.load(f)
+                self.assertTrue(4 * 200 < result['hands'] < 4 * 400)
+                self.assertEqual(result['cells'], 4)
+                self.assertTrue(2 < result['cards_per_hand'] < 4)
+                self.assertFalse(result['profiled'])
+
+        # Only a profiled run splits its time
+        with tempfile.TemporaryDirectory() as tmp:
+            profile, stats = (os.path.join(tmp, 'run.prof'), os.path.join(tmp, 'stats.json'))
+            with redirect_stdout(io.StringIO()):
+                hands, _ = run_profiled(build_table, (200, ['H15', 'S17'], 'distribution', 1), profile, stats,
+                                        hands=lambda counts: counts[0])
+            with open(stats) as f:
+                result = json.load(f)
+        self.assertEqual(hands, 2 * 200)
+        self.assertGreater(result['time_split']['stand'], 0)
+
+    def test_build_table_workers(self):
+        # The table only depends on the seed, not on the number of workers
+        strategies = ['H15', 'S17']
+        for engine in ('game', 'distribution'):
+            tables = []
+            for workers in (1, 2):
+                out = io.StringIO()
+                with redirect_stdout(out):
+                    build_table(500, strategies, engine, seed=3, workers=workers)
+                tables.append(out.getvalue())
+            with self.subTest(engine=engine):
+                self.assertEqual(tables[0], tables[1])
+                self.assertEqual(tables[0].splitlines()[0], 'P-Strategy,D-H15,D-S17')
+
+    @mock.patch('blackjack3.CHECKPOINT_RUNS', 2000)
+    def test_build_table_resume(self):
+        # A table resumed from a checkpoint is the same as one built in one go
+        strategies = ['H15', 'S17', 'H20']
+
+        def table(**kwargs):
+            out = io.StringIO()
+            with redirect_stdout(out):
+                build_table(5000, strategies, **kwargs)
+            return out.getvalue()
+
+        full = table(seed=9)
+        save = blackjack3.save_checkpoint
+
+        def interrupt(fname, checkpoint):
+            save(fname, checkpoint)
+            raise KeyboardInterrupt
+
+        with tempfile.TemporaryDirectory() as tmp:
+            fname = os.path.join(tmp, 'checkpoint.json')
+            with mock.patch('blackjack3.save_checkpoint', interrupt):
+                with self.assertRaises(KeyboardInterrupt):
+                    table(seed=9, checkpoint=fname)
+            self.assertEqual(table(checkpoint=fname, resume=True), full)
+
+            # Other settings can not resume the checkpoint
+            with self.assertRaises(ValueError):
+                table(seed=10, checkpoint=fname, resume=True)
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
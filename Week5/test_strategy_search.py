@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+
+import unittest
+from blackjack3 import exact_outcome_distribution, win_chance
+from strategy_search import (policy_distribution, strategy_policy, dominates, undominated,
+                             win_bound, cumulative, search)
+
+class TestStrategySearch(unittest.TestCase):
+
+    def test_strategy_policy(self):
+        # Policies play like the strategies they come from
+        for strategy in ['H13', 'S13', 'H17', 'S17', 'H20', 'S20']:
+            with self.subTest(strategy=strategy):
+                policy = strategy_policy(strategy)
+                expected = exact_outcome_distribution(strategy)
+                for a, b in zip(policy_distribution(policy), expected):
+                    self.assertAlmostEqual(a, b)
+
+    def test_dominates(self):
+        # Hitting a hard 11 can not bust, so it beats standing on it
+        self.assertTrue(dominates(policy_distribution((12, 18)), policy_distribution((11, 18))))
+        self.assertFalse(dominates(policy_distribution((11, 18)), policy_distribution((12, 18))))
+        kept = undominated([(hard, 18) for hard in range(4, 13)])
+        self.assertEqual(kept, [(12, 18)])
+
+    def test_win_bound(self):
+        # The bound is never below the win chance
+        for dealer in [(13, 14), (17, 18), (20, 20)]:
+            dealer_dist = policy_distribution(dealer)
+            for player in [(12, 12), (15, 19), (21, 21)]:
+                chance = win_chance(policy_distribution(player), dealer_dist)
+                bound = win_bound(policy_distribution(player), cumulative(dealer_dist))
+                self.assertLessEqual(chance, bound + 1e-12)
+
+    def test_search(self):
+        # Pruning finds the same best win chance as trying every policy
+        policies = [(hard, soft) for hard in range(4, 22) for soft in range(12, 22)]
+        for row in search([(17, 18), (15, 15), (20, 21)]):
+            with self.subTest(dealer=row['dealer']):
+                dealer_dist = policy_distribution(row['dealer'])
+                best = max(win_chance(policy_distribution(p), dealer_dist) for p in policies)
+                self.assertAlmostEqual(row['win'], best)
+                self.assertLessEqual(row['evaluated'], row['candidates'])
+                self.assertLess(row['candidates'], len(policies))
+
+if __name__ == '__main__':
+    unittest.main()